@@ -0,0 +1,251 @@
+import math
+import time
+
+import numpy as np
+
+# Bot AI, run for every enemy cell at once.
+#
+# Planning: bots look around with k-nearest queries on the spatial grids and
+# pick what to do: flee a nearby bigger rival, hunt a smaller one, or go for
+# the closest food. The choice and its target are cached on the bot until it
+# plans again. Bots that are due to re-plan are scheduled nearest to a player
+# first, then longest waiting first, and planning stops once the tick's time
+# budget (or, without a budget, a fixed number of plans) is used up; the
+# rest wait for a later tick.
+#
+# Steering: every tick the bots' state is gathered into arrays and steering
+# towards (or away from) the cached targets, movement, friction, cooldowns
+# and world bounds are computed in one vectorized pass. Only the rare
+# per-bot events (shooting, buying a weapon, splitting) run as Python.
+
+# What a bot is doing, stored in EnemyCell.ai_mode
+WANDER, FORAGE, HUNT, FLEE = range(4)
+
+BOT_TURN_CHANCE = 0.005  # Per tick chance a wandering bot picks a new heading
+BOT_SPLIT_CHANCE = 0.005  # Per tick chance a bot that can split does
+BOT_SPLIT_MASS = 400
+BOT_WEAPON_MASS = 5000  # Bots buy a random weapon once they are this heavy
+BOT_AIM_DISTANCE = 100  # Bots without a target shoot this far ahead of them
+
+BOT_VIEW_RADIUS = 400  # How far a bot looks when planning
+BOT_NEIGHBORS = 8  # Nearest rival cells a bot considers
+BOT_FLEE_DISTANCE = 150  # Gap between edges at which a bot runs from a bigger rival
+BOT_REPLAN_TICKS = 10  # Each bot re-plans at most this often...
+BOT_PLANS_PER_TICK = 32  # ...and without a time budget, no more than this many plan in one tick
+BOT_PRIORITY_RADIUS = 800  # Bots this close to a player cell plan first
+
+# What the AI did in its last tick
+class AIStats:
+    def __init__(self):
+        self.planned = 0  # Bots that re-planned
+        self.deferred = 0  # Bots due to re-plan that had to wait
+        self.plan_ms = 0.0  # Time spent planning
+        self.overrun = False  # Planning went over the budget
+        self.overruns = 0  # Ticks that went over the budget, in total
+
+class BotAI:
+    def __init__(self, rng, width, height, budget_ms=None):
+        self.rng = rng
+        self.width = width
+        self.height = height
+        # Milliseconds of planning per tick. None plans a fixed number of bots
+        # instead, which keeps runs deterministic.
+        self.budget_ms = budget_ms
+        self.plan_cost_ms = 0.05  # Running average cost of one plan
+        # Exact number of bots to plan next tick, in place of the budget; set
+        # by replays so a budgeted run plans the same bots on playback
+        self.plan_quota = None
+        self.stats = AIStats()
+
+    def step(self, world, dt):
+        bots = world.enemy_list.items
+        count = len(bots)
+        if not count:
+            return
+
+        self.schedule_plans(world, bots)
+
+        state = np.array([bot_state(bot) for bot in bots], dtype=float)
+        (x, y, dx, dy, radius, speed, mass, split_cooldown, weapon_cooldown, armed,
+         mode, target_x, target_y) = state.T
+
+        # Head for prey and food, away from threats
+        to_x = target_x - x
+        to_y = target_y - y
+        flee = mode == FLEE
+        seek = (mode == HUNT) | (mode == FORAGE) | flee
+        to_x[flee] = -to_x[flee]
+        to_y[flee] = -to_y[flee]
+        dx = np.where(seek, to_x, dx)
+        dy = np.where(seek, to_y, dy)
+        # A bot standing on its food goes back to wandering until it re-plans
+        arrived = (mode == FORAGE) & (to_x * to_x + to_y * to_y < radius * radius)
+        mode[arrived] = WANDER
+
+        # Wandering bots occasionally turn to a random heading
+        turn = (mode == WANDER) & (self.rng.random(count) < BOT_TURN_CHANCE)
+        angle = self.rng.uniform(0, 2 * math.pi, count)
+        if world.battle_royale_mode:
+            # Bots caught outside the safe zone head for its center
+            to_x = world.safe_zone_center[0] - x
+            to_y = world.safe_zone_center[1] - y
+            margin = world.safe_zone_radius - radius
+            outside = (margin < 0) | (to_x * to_x + to_y * to_y > margin * margin)
+            dx = np.where(outside, to_x, dx)
+            dy = np.where(outside, to_y, dy)
+            turn &= ~outside
+        dx = np.where(turn, np.cos(angle), dx)
+        dy = np.where(turn, np.sin(angle), dy)
+
+        # Normalize direction
+        length = np.hypot(dx, dy)
+        moving = length != 0
+        dx = np.divide(dx, length, out=np.zeros(count), where=moving)
+        dy = np.divide(dy, length, out=np.zeros(count), where=moving)
+
+        # Move, slower when larger
+        step = np.divide(speed * 20, radius, out=np.zeros(count), where=radius > 0)
+        x += dx * step
+        y += dy * step
+        # Aim at the cell being hunted or fled from, otherwise straight ahead
+        aim = (mode == HUNT) | flee
+        aim_x = np.where(aim, target_x, x + dx * BOT_AIM_DISTANCE)
+        aim_y = np.where(aim, target_y, y + dy * BOT_AIM_DISTANCE)
+
+        # Cell.update for every bot: drift, friction, cooldowns, world bounds
+        x += dx * dt
+        y += dy * dt
+        dx *= 0.90
+        dy *= 0.90
+        split_cooldown = np.where(split_cooldown > 0, split_cooldown - dt, 0)
+        weapon_cooldown = np.where(weapon_cooldown > 0, weapon_cooldown - dt, 0)
+        x = np.maximum(radius, np.minimum(self.width - radius, x))
+        y = np.maximum(radius, np.minimum(self.height - radius, y))
+
+        for bot, bot_x, bot_y, bot_dx, bot_dy, bot_split, bot_weapon in zip(
+                bots, x.tolist(), y.tolist(), dx.tolist(), dy.tolist(),
+                split_cooldown.tolist(), weapon_cooldown.tolist()):
+            bot.pos[0] = bot_x
+            bot.pos[1] = bot_y
+            bot.direction = [bot_dx, bot_dy]
+            bot.split_cooldown = bot_split
+            bot.weapon_cooldown = bot_weapon
+        for index in np.flatnonzero(arrived).tolist():
+            bots[index].ai_mode = WANDER
+
+        # Rare events, one bot at a time. Splitting appends new bots to the
+        # registry, which leaves the indices below valid.
+        shooters = np.flatnonzero((armed != 0) & (weapon_cooldown <= 0))
+        for index, target_x, target_y in zip(shooters.tolist(), aim_x[shooters].tolist(), aim_y[shooters].tolist()):
+            bots[index].shoot(target_x, target_y, world.bullets)
+
+        for index in np.flatnonzero((armed == 0) & (mass >= BOT_WEAPON_MASS)).tolist():
+            bots[index].buy_weapon(('gun', 'rpg')[self.rng.integers(2)])
+
+        splitters = np.flatnonzero((mass >= BOT_SPLIT_MASS) & (split_cooldown <= 0) &
+                                   (self.rng.random(count) < BOT_SPLIT_CHANCE))
+        for index in splitters.tolist():
+            bots[index].split(world)
+
+    def schedule_plans(self, world, bots):
+        # Re-plan the bots that are due, in priority order, within the budget
+        stats = self.stats
+        count = len(bots)
+        planned_tick = np.fromiter((bot.ai_planned_tick for bot in bots), dtype=np.int64, count=count)
+        due = np.flatnonzero(world.tick - planned_tick >= BOT_REPLAN_TICKS)
+        if not len(due):
+            stats.planned = stats.deferred = 0
+            stats.plan_ms = 0.0
+            stats.overrun = False
+            return
+
+        # Bots near any player cell first, then the ones waiting longest
+        far = np.ones(len(due), dtype=bool)
+        players = world.player_cells.items
+        if players:
+            x = np.fromiter((bots[index].pos[0] for index in due.tolist()), dtype=float, count=len(due))
+            y = np.fromiter((bots[index].pos[1] for index in due.tolist()), dtype=float, count=len(due))
+            for cell in players:
+                far &= (x - cell.pos[0]) ** 2 + (y - cell.pos[1]) ** 2 > BOT_PRIORITY_RADIUS ** 2
+        order = due[np.lexsort((planned_tick[due], far))]
+
+        start = time.perf_counter_ns()
+        planned = 0
+        if self.plan_quota is not None or self.budget_ms is None:
+            quota = BOT_PLANS_PER_TICK if self.plan_quota is None else self.plan_quota
+            for index in order[:quota].tolist():
+                self.plan(world, bots[index])
+                planned += 1
+        else:
+            budget_ns = self.budget_ms * 1e6
+            cost_ns = self.plan_cost_ms * 1e6
+            for index in order.tolist():
+                # Stop if the next plan would probably not fit in the budget
+                if time.perf_counter_ns() - start + cost_ns > budget_ns and planned:
+                    break
+                self.plan(world, bots[index])
+                planned += 1
+        elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+        if planned:
+            self.plan_cost_ms += (elapsed_ms / planned - self.plan_cost_ms) * 0.1
+
+        stats.planned = planned
+        stats.deferred = len(order) - planned
+        stats.plan_ms = elapsed_ms
+        stats.overrun = self.budget_ms is not None and elapsed_ms > self.budget_ms
+        if stats.overrun:
+            stats.overruns += 1
+
+    def plan(self, world, bot):
+        # Pick the bot's next goal from what is around it
+        bot.ai_planned_tick = world.tick
+        x, y = bot.pos
+        team = bot.team
+        neighbors = world.cell_hash.nearest(
+            x, y, BOT_NEIGHBORS, BOT_VIEW_RADIUS, cell_position,
+            lambda cell: cell.team != team and cell.alive
+        )
+        prey = None
+        for dist_sq, cell in neighbors:
+            if cell.radius > bot.radius * 1.1:
+                if math.sqrt(dist_sq) - cell.radius - bot.radius < BOT_FLEE_DISTANCE:
+                    bot.ai_mode = FLEE
+                    bot.ai_target = cell
+                    return
+            elif prey is None and bot.radius > cell.radius * 1.1:
+                prey = cell
+        if prey is not None:
+            bot.ai_mode = HUNT
+            bot.ai_target = prey
+            return
+
+        bot.ai_target = None
+        food = world.food
+        pellets = world.food_hash.nearest(x, y, 1, BOT_VIEW_RADIUS, lambda index: (food.x[index], food.y[index]))
+        if pellets:
+            index = pellets[0][1]
+            bot.ai_mode = FORAGE
+            bot.ai_goal = [float(food.x[index]), float(food.y[index])]
+        else:
+            bot.ai_mode = WANDER
+
+def cell_position(cell):
+    return cell.pos
+
+def bot_state(bot):
+    # One row of the AI's state arrays
+    mode = bot.ai_mode
+    target = bot.ai_target
+    if mode == HUNT or mode == FLEE:
+        if target.alive:
+            target_x, target_y = target.pos
+        else:
+            mode = WANDER  # Target died; wander until the next plan
+            target_x, target_y = bot.pos
+    elif mode == FORAGE:
+        target_x, target_y = bot.ai_goal
+    else:
+        target_x, target_y = bot.pos
+    return (bot.pos[0], bot.pos[1], bot.direction[0], bot.direction[1], bot.radius, bot.speed,
+            bot.mass, bot.split_cooldown, bot.weapon_cooldown, bot.weapon != 'none',
+            mode, target_x, target_y)
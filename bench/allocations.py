@@ -0,0 +1,106 @@
+# Per-tick allocations of world.step, measured with tracemalloc, for the
+# old and the new way of walking every cell.
+#
+#   python -m bench.allocations [--cells 500] [--ticks 100]
+#
+# The old code built player_cells + enemy_list for every walk over the
+# cells; the new one chains the two registries (World.all_cells). Both
+# worlds play the same seeded ticks, the old one with all_cells swapped for
+# the concatenation. For each the benchmark reports:
+#
+#   walks    calls to all_cells() per tick
+#   blocks   tracemalloc blocks those walks allocate per tick, from the
+#            statistics of a snapshot of that tick alone; the walks are kept
+#            alive until the end of the tick so the snapshot sees them
+#   KB       blocks' size per tick
+#   peak KB  peak memory allocated on top of the steady state while a tick
+#            runs, with nothing kept alive
+import argparse
+import tracemalloc
+
+from simulation import World
+
+def make_world(cells, seed):
+    world = World('classic', flags=['none'], seed=seed)
+    world.add_player('Bench', 'none')
+    world.start()
+    top_up(world, cells)
+    return world
+
+def top_up(world, cells):
+    # Extra enemies so the cell loops dominate, replacing the ones eaten
+    while world.cell_count() < cells:
+        world.spawn_enemy()
+
+def concatenate_cells(world):
+    # The old code path: every walk builds a combined list
+    world.all_cells = lambda: world.player_cells.items + world.enemy_list.items
+
+def keep_walks(world, kept):
+    # Hold on to whatever all_cells() returns so a snapshot can count it
+    all_cells = world.all_cells
+    def walk():
+        cells = all_cells()
+        kept.append(cells)
+        return cells
+    world.all_cells = walk
+    return all_cells, walk.__code__.co_firstlineno + 1  # The original, and the line that calls it
+
+def peak_during(function):
+    # Bytes allocated above the current level while function runs
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    function()
+    return tracemalloc.get_traced_memory()[1] - before
+
+def measure(world, cells, ticks):
+    # (walks, blocks, bytes, peak bytes) per tick
+    tracemalloc.start()
+    peaks = []
+    for _ in range(ticks):
+        top_up(world, cells)
+        peaks.append(peak_during(world.step))
+    tracemalloc.stop()
+    peaks.sort()
+
+    # Trace one tick at a time, so a snapshot at its end holds only what the
+    # tick allocated and kept, and count what the line making the walks holds
+    kept = []
+    all_cells, walk_line = keep_walks(world, kept)
+    walk_filter = [tracemalloc.Filter(True, __file__, walk_line, all_frames=True)]
+    walks = blocks = size = 0
+    for _ in range(ticks):
+        top_up(world, cells)
+        tracemalloc.start(2)  # all_cells() and the line in keep_walks that calls it
+        world.step()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        for stat in snapshot.filter_traces(walk_filter).statistics('filename'):
+            blocks += stat.count
+            size += stat.size
+        walks += len(kept)
+        kept.clear()
+    world.all_cells = all_cells
+    return walks / ticks, blocks / ticks, size / ticks, peaks[len(peaks) // 2]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cells', type=int, default=500)
+    parser.add_argument('--ticks', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    old = make_world(args.cells, args.seed)
+    concatenate_cells(old)
+    new = make_world(args.cells, args.seed)
+    results = [('concatenated lists', measure(old, args.cells, args.ticks)),
+               ('all_cells() view', measure(new, args.cells, args.ticks))]
+
+    print(f"world.step with {args.cells} cells, per tick over {args.ticks} ticks")
+    print(f"{'':<20} {'walks':>6} {'blocks':>8} {'KB':>8} {'peak KB':>8}")
+    for label, (walks, blocks, size, peak) in results:
+        print(f"{label:<20} {walks:>6.1f} {blocks:>8.1f} {size / 1024:>8.1f} {peak / 1024:>8.1f}")
+    print("Both worlds in lockstep" if old.state_hash() == new.state_hash() else "Worlds diverged")
+
+if __name__ == '__main__':
+    main()
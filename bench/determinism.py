@@ -0,0 +1,65 @@
+# Lockstep check: the same seed and the same inputs must give the same
+# state hash on every tick, in this process and in a fresh one.
+#
+#   python -m bench.determinism [--ticks 1800] [--seed 7]
+import argparse
+import multiprocessing
+import sys
+
+from simulation import World, PlayerInput, MODES
+
+def scripted_input(tick):
+    # A player that circles around, splitting and shooting now and then
+    return PlayerInput(
+        target=(1000 + 600 * ((tick // 240) % 2 * 2 - 1), 1000 + 400 * ((tick // 360) % 2 * 2 - 1)),
+        split=tick % 300 == 0,
+        shoot=tick % 20 == 0,
+        weapon='gun'
+    )
+
+def run(job):
+    mode, seed, ticks = job
+    world = World(mode, seed=seed, flags=['none'])
+    player = world.add_player('Lockstep', 'none', 'red' if mode == 'teams' else None)
+    world.start()
+    hashes = [world.state_hash()]
+    for tick in range(ticks):
+        world.step({player.id: scripted_input(tick)})
+        hashes.append(world.state_hash())
+    return hashes
+
+def first_difference(a, b):
+    for tick, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return tick
+    return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ticks', type=int, default=1800)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    failed = False
+    with multiprocessing.Pool(1) as pool:
+        for mode in MODES:
+            job = (mode, args.seed, args.ticks)
+            here = run(job)
+            again = run(job)
+            elsewhere = pool.apply(run, (job,))
+            other_seed = run((mode, args.seed + 1, args.ticks))
+            for label, hashes in (('same process', again), ('other process', elsewhere)):
+                tick = first_difference(here, hashes)
+                if tick is not None:
+                    failed = True
+                    print(f"{mode}: {label} diverged at tick {tick}")
+            if here[-1] == other_seed[-1]:
+                failed = True
+                print(f"{mode}: a different seed gave the same final state")
+            print(f"{mode}: {args.ticks} ticks, final hash {here[-1]}")
+    if failed:
+        sys.exit(1)
+    print("All runs in lockstep")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Bytes a client receives per state update, with interest management and
+# delta encoding, as the amount of food and then the size of the world
+# grow. The first update sends the whole screen; after that a client only
+# hears about what changed on it, so the steady state stays close to flat
+# while a full world update grows with the food count.
+#
+#   python -m bench.interest [--players 50] [--ticks 600]
+import argparse
+import random
+import statistics
+import time
+
+from interest import Viewer, ViewFrame
+from protocol import CELL_RECORD, FOOD_RECORD
+from simulation import World, PlayerInput, WORLD_WIDTH
+
+FOOD_COUNTS = [200, 2000, 20000]
+WORLD_SIZES = [2000, 10000, 50000]  # At the default food density
+SEND_EVERY = 3  # As the server at 20 updates per second
+
+def run(food_count, player_count, ticks, size=WORLD_WIDTH):
+    world = World('classic', flags=['none'], food_count=food_count, seed=1, width=size, height=size)
+    world.start()
+    rng = random.Random(1)
+    players = [world.add_player(f"Bench{index}", 'none', at_center=False) for index in range(player_count)]
+    viewers = [Viewer() for _ in players]
+    first = []
+    steady = []
+    update_ns = 0
+    updates = 0
+    for tick in range(1, ticks + 1):
+        inputs = {}
+        for player in players:
+            if player.state == "running" and rng.random() < 0.05:
+                inputs[player.id] = PlayerInput(target=(rng.uniform(0, size), rng.uniform(0, size)))
+        world.step(inputs)
+        if tick % SEND_EVERY:
+            continue
+        start = time.perf_counter_ns()
+        view_frame = ViewFrame(world)
+        for player, viewer in zip(players, viewers):
+            names, delta = viewer.update(view_frame, player)
+            (steady if viewer.sequence > 1 else first).append(len(delta))
+            viewer.ack(viewer.sequence)  # A client on a good link acknowledges everything
+        update_ns += time.perf_counter_ns() - start
+        updates += len(players)
+    full = world.cell_count() * CELL_RECORD.itemsize + world.food_count * FOOD_RECORD.itemsize
+    return statistics.mean(first), statistics.mean(steady), full, update_ns / updates / 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=50)
+    parser.add_argument('--ticks', type=int, default=600)
+    args = parser.parse_args()
+
+    print(f"{args.players} players, {args.ticks} ticks, an update every {SEND_EVERY} ticks")
+    print(f"{'food':>6} {'first update':>13} {'steady update':>14} {'full world':>11} {'us/viewer':>10}")
+    for food_count in FOOD_COUNTS:
+        first, steady, full, update_us = run(food_count, args.players, args.ticks)
+        print(f"{food_count:>6} {first:>11.0f} B {steady:>12.0f} B {full:>9.0f} B {update_us:>10.0f}")
+    print()
+    print(f"{'world':>6} {'first update':>13} {'steady update':>14} {'full world':>11} {'us/viewer':>10}")
+    for size in WORLD_SIZES:
+        first, steady, full, update_us = run(None, args.players, args.ticks, size)
+        print(f"{size:>6} {first:>11.0f} B {steady:>12.0f} B {full:>9.0f} B {update_us:>10.0f}")
+
+if __name__ == '__main__':
+    main()
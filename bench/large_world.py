@@ -0,0 +1,51 @@
+# Tick time of worlds from the default 2000 x 2000 up to 100,000 x 100,000,
+# with the same cells and the default food density. Food is only generated
+# in chunks a cell has come near and dormant chunks cost nothing per tick,
+# so tick time and food in memory follow the cells, not the world's area.
+#
+#   python -m bench.large_world [--players 10] [--ticks 1200]
+import argparse
+import random
+import time
+
+from simulation import World, PlayerInput
+
+WORLD_SIZES = [2000, 10000, 50000, 100000]
+WANDER_DISTANCE = 1500  # How far from its cell a player picks targets
+
+def run(size, player_count, ticks):
+    start = time.perf_counter()
+    world = World('classic', flags=['none'], seed=1, width=size, height=size)
+    players = [world.add_player(f"Bench{index}", 'none', at_center=False) for index in range(player_count)]
+    world.start()
+    setup = time.perf_counter() - start
+
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        inputs = {}
+        for player in players:
+            cells = world.cells_of(player.id)
+            if cells and (player.target is None or rng.random() < 0.01):
+                x, y = cells[0].pos
+                inputs[player.id] = PlayerInput(target=(x + rng.uniform(-WANDER_DISTANCE, WANDER_DISTANCE),
+                                                        y + rng.uniform(-WANDER_DISTANCE, WANDER_DISTANCE)))
+        world.step(inputs)
+    tick_ms = (time.perf_counter() - start) / ticks * 1000
+    chunks = world.chunks
+    return setup * 1000, tick_ms, len(chunks.chunks), len(chunks.awake_chunks()), len(world.food.x), world.food_count
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=10)
+    parser.add_argument('--ticks', type=int, default=1200)
+    args = parser.parse_args()
+
+    print(f"{args.players} players and the default bots, {args.ticks} ticks")
+    print(f"{'world':>7} {'setup ms':>9} {'ms/tick':>8} {'chunks':>7} {'awake':>6} {'food made':>10} {'world food':>11}")
+    for size in WORLD_SIZES:
+        setup_ms, tick_ms, generated, awake, food, food_count = run(size, args.players, args.ticks)
+        print(f"{size:>7} {setup_ms:>9.1f} {tick_ms:>8.2f} {generated:>7} {awake:>6} {food:>10} {food_count:>11}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Players leaving and joining again mid-match, the way server.py does it:
+# split players that leave, players that rejoin after dying, and a long run
+# of churn. The world must keep stepping, forget every player that left and
+# not slow down.
+#
+#   python -m bench.players [--cycles 5000]
+import argparse
+import sys
+import time
+
+from simulation import World, PlayerInput
+
+def tick_ms(world, ticks=60):
+    start = time.perf_counter()
+    for _ in range(ticks):
+        world.step()
+    return (time.perf_counter() - start) / ticks * 1000
+
+def split_and_leave(world):
+    # A player with several cells leaves; it is gone once they are flushed
+    player = world.add_player('Splitter', 'none')
+    world.step({player.id: PlayerInput(target=(0, 0), split=True)})
+    cells = len(world.cells_of(player.id))
+    world.remove_player(player.id)
+    world.step()
+    return cells, player.id in world.players
+
+def rejoin(world):
+    # A player dies with several cells, then joins again as a new player
+    player = world.add_player('Rejoiner', 'none')
+    world.step({player.id: PlayerInput(target=(0, 0), split=True)})
+    for cell in world.cells_of(player.id):
+        world.kill_cell(cell)
+    world.step()
+    dead = player.state == "game_over"
+    world.remove_player(player.id)
+    again = world.add_player('Rejoiner', 'none')
+    world.step()
+    return dead and player.id not in world.players and again.id in world.players
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cycles', type=int, default=5000)
+    args = parser.parse_args()
+
+    failed = False
+    world = World('classic', seed=1, flags=['none'])
+    world.start()
+
+    cells, kept = split_and_leave(world)
+    print(f"split player with {cells} cells left: {'kept' if kept else 'removed'}")
+    failed |= cells < 2 or kept
+    if not rejoin(world):
+        failed = True
+        print("player that died and rejoined was not replaced")
+
+    before = tick_ms(world)
+    for cycle in range(args.cycles):
+        player = world.add_player('Churn', 'none')
+        world.step({player.id: PlayerInput(target=(0, 0), split=cycle % 2 == 0)})
+        world.remove_player(player.id)
+    world.step()
+    after = tick_ms(world)
+    print(f"{args.cycles} join/leave cycles: {len(world.players)} players left, "
+          f"tick {before:.2f} ms before, {after:.2f} ms after")
+    failed |= len(world.players) != 1
+    if failed:
+        sys.exit(1)
+    print("Every player that left was removed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Snapshot save and restore time for a full battle royale world: 50 players
+# (one human, 49 bots) and 10k food. Both should stay under 5 ms. A restore
+# leaves nothing for later, so the first tick after one is timed too, against
+# the same tick in the original world.
+#
+#   python -m bench.snapshot [--food 10000] [--ticks 60]
+import argparse
+import statistics
+import time
+
+TARGET_MS = 5
+PLAYERS = 50
+
+from simulation import World, PlayerInput
+from snapshot import dump_snapshot, restore_snapshot
+
+def timed(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(times), max(times)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--food', type=int, default=10000)
+    parser.add_argument('--ticks', type=int, default=60, help='Ticks to play before saving')
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    world = World('battle_royale', flags=['none'], food_count=args.food, seed=1)
+    player = world.add_player('Bench', 'none')
+    world.start()
+    for tick in range(args.ticks):
+        world.step({player.id: PlayerInput(target=(1000, 1000), shoot=tick % 10 == 0)})
+    # Bring back the players the warm-up killed, and the eaten food
+    while world.cell_count() < PLAYERS:
+        world.spawn_enemy()
+    world.food.respawn_timer[:] = 0
+    world.update_food(0)
+    print(f"{world.cell_count()} cells, {len(world.food)} food, {len(world.bullets)} bullets")
+
+    data, save_ms, save_max = timed(lambda: dump_snapshot(world), args.repeats)
+    restored, load_ms, load_max = timed(lambda: restore_snapshot(data), args.repeats)
+    copies = [restore_snapshot(data) for _ in range(args.repeats)]
+    _, first_ms, first_max = timed(lambda: copies.pop().step(), args.repeats)
+    start = time.perf_counter()
+    world.step()
+    tick_ms = (time.perf_counter() - start) * 1000
+    print(f"Snapshot: {len(data) / 1024:.0f} KB")
+    for label, median, worst in (('Save', save_ms, save_max), ('Restore', load_ms, load_max)):
+        verdict = "within" if median <= TARGET_MS else "MISSES"
+        print(f"{label + ':':<9} {median:.2f} ms median, {worst:.2f} ms max, {verdict} the {TARGET_MS} ms target")
+    print(f"First tick after a restore: {first_ms:.2f} ms median, {first_max:.2f} ms max "
+          f"(the same tick in the original world: {tick_ms:.2f} ms)")
+
+    # The restored world has to carry on exactly like the original
+    restored.step()
+    for tick in range(60):
+        world.step()
+        restored.step()
+    print("Restored world in lockstep" if world.state_hash() == restored.state_hash() else "Restored world diverged")
+
+if __name__ == '__main__':
+    main()
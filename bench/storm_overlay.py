@@ -0,0 +1,88 @@
+# Milliseconds per frame spent drawing the battle royale storm.
+#
+#   python -m bench.storm_overlay [--frames 600]
+#
+# Times the original draw_safe_zone (two fresh full-screen surfaces per
+# frame), an overlay allocated once but refilled whenever the zone moves on
+# screen, and the storm pieces in agario.py, with the safe zone edge in
+# view. Each runs with a still camera and zone, with the camera panning,
+# and with the camera panning while the zone shrinks. Runs on SDL's dummy
+# video driver.
+import argparse
+import os
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import agario
+from simulation import World
+
+def draw_safe_zone_uncached(world):
+    # draw_safe_zone as it was before the storm was cached
+    storm_overlay = pygame.Surface((agario.SCREEN_WIDTH, agario.SCREEN_HEIGHT), pygame.SRCALPHA)
+    storm_overlay.fill(agario.FORTNITE_STORM_COLOR)
+    safe_zone_mask = pygame.Surface((agario.SCREEN_WIDTH, agario.SCREEN_HEIGHT), pygame.SRCALPHA)
+    safe_zone_mask.fill((0, 0, 0, 0))
+    screen_x = world.safe_zone_center[0] - agario.camera_pos[0]
+    screen_y = world.safe_zone_center[1] - agario.camera_pos[1]
+    pygame.draw.circle(safe_zone_mask, (0, 0, 0, 255), (int(screen_x), int(screen_y)), int(world.safe_zone_radius))
+    storm_overlay.blit(safe_zone_mask, (0, 0), special_flags=pygame.BLEND_RGBA_SUB)
+    agario.screen.blit(storm_overlay, (0, 0))
+    pygame.draw.circle(agario.screen, agario.BLUE, (int(screen_x), int(screen_y)), int(world.safe_zone_radius), 2)
+
+overlay = None
+overlay_key = None
+
+def draw_safe_zone_overlay(world):
+    # One overlay surface, refilled when the zone's screen position or radius changes
+    global overlay, overlay_key
+    if overlay is None:
+        overlay = pygame.Surface((agario.SCREEN_WIDTH, agario.SCREEN_HEIGHT), pygame.SRCALPHA)
+    screen_x = int(world.safe_zone_center[0] - agario.camera_pos[0])
+    screen_y = int(world.safe_zone_center[1] - agario.camera_pos[1])
+    radius = int(world.safe_zone_radius)
+    key = (screen_x, screen_y, radius)
+    if key != overlay_key:
+        overlay.fill(agario.FORTNITE_STORM_COLOR)
+        pygame.draw.circle(overlay, (0, 0, 0, 0), (screen_x, screen_y), radius)
+        overlay_key = key
+    agario.screen.blit(overlay, (0, 0))
+    pygame.draw.circle(agario.screen, agario.BLUE, (screen_x, screen_y), radius, 2)
+
+def run(draw, world, frames, pan, shrink):
+    # The zone's right edge stays on screen; the camera pans up and down
+    # along it, 2 px a frame, and the zone loses 1 px of radius a frame
+    start_radius = world.safe_zone_radius
+    center_x, center_y = world.safe_zone_center
+    elapsed = 0
+    for frame in range(frames):
+        world.safe_zone_radius = start_radius - (frame if shrink else 0)
+        agario.camera_pos[0] = center_x + world.safe_zone_radius - agario.SCREEN_WIDTH / 2
+        agario.camera_pos[1] = center_y - agario.SCREEN_HEIGHT / 2 + (2 * (frame % 200) - 200 if pan else 0)
+        start = time.perf_counter()
+        draw(world)
+        elapsed += time.perf_counter() - start
+    world.safe_zone_radius = start_radius
+    return elapsed / frames * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=600)
+    args = parser.parse_args()
+
+    agario.init_display()
+    world = World('battle_royale', flags=[])
+    world.initialize_battle_royale()
+    draws = (('uncached', draw_safe_zone_uncached), ('overlay', draw_safe_zone_overlay),
+             ('pieces', agario.draw_safe_zone))
+    print(f"draw_safe_zone over {args.frames} frames, ms/frame")
+    print(f"{'':<10} {'still':>8} {'panning':>8} {'shrinking':>10}")
+    for label, draw in draws:
+        times = [run(draw, world, args.frames, pan, shrink) for pan, shrink in ((False, False), (True, False),
+                                                                                  (True, True))]
+        print(f"{label:<10} {times[0]:>8.3f} {times[1]:>8.3f} {times[2]:>10.3f}")
+
+if __name__ == '__main__':
+    main()
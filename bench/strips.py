@@ -0,0 +1,82 @@
+# Parallel collision detection on a crowded large world. Only detection
+# runs in the workers; everything else check_collisions does (sorting and
+# copying the food into shared memory, merging results, feeding) and the
+# rest of the tick stay in the main process. Speed-up is measured against
+# the same strip code with one worker, for worker counts up to the cores
+# this machine has, and the serial share at one worker gives the bound any
+# worker count can reach (Amdahl's law), for collisions and for the whole
+# tick. The old single-process loop is timed for reference. Every run
+# restores the same snapshot and plays the same ticks, so the final states
+# must all match.
+#
+#   python -m bench.strips [--bots 2000] [--size 20000] [--ticks 60] [--workers 1 2 4]
+import argparse
+import os
+import time
+
+from simulation import World
+from snapshot import dump_snapshot, restore_snapshot
+from strips import StripPool
+
+
+def run(data, workers, ticks):
+    # (collisions ms/tick, serial collisions ms/tick, tick ms, final state hash)
+    world = restore_snapshot(data)
+    if workers:
+        world.strips = StripPool(workers)
+    check_collisions = world.check_collisions
+    spent = [0]
+    def timed():
+        start = time.perf_counter_ns()
+        check_collisions()
+        spent[0] += time.perf_counter_ns() - start
+    world.check_collisions = timed
+    start = time.perf_counter_ns()
+    for _ in range(ticks):
+        world.step()
+    elapsed = time.perf_counter_ns() - start
+    parallel = world.strips.parallel_ns if workers else 0
+    world.close()
+    return ((spent[0] / ticks / 1e6), (spent[0] - parallel) / ticks / 1e6, elapsed / ticks / 1e6,
+            world.state_hash())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bots', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=20000)
+    parser.add_argument('--food', type=int, default=200000)
+    parser.add_argument('--ticks', type=int, default=60)
+    parser.add_argument('--workers', type=int, nargs='+', help='Worker counts (default: 1, 2, 4... up to the cores)')
+    args = parser.parse_args()
+    # One worker always runs first: it is what the others are measured against
+    worker_counts = sorted({1, *(args.workers or [2 ** n for n in range(os.cpu_count().bit_length())])})
+
+    world = World('classic', flags=['none'], seed=1, enemy_count=args.bots, food_count=args.food,
+                  width=args.size, height=args.size)
+    world.start()
+    for _ in range(30):
+        world.step()
+    data = dump_snapshot(world)
+    print(f"{world.cell_count()} cells, {len(world.food)} food in a {args.size} x {args.size} world, "
+          f"{os.cpu_count()} cores")
+
+    single_ms, _, single_tick_ms, single_hash = run(data, 0, args.ticks)
+    print(f"{'workers':>7} {'collisions ms':>14} {'speedup':>8} {'serial ms':>10} {'serial':>7} {'tick ms':>8}  state")
+    base_ms = base_serial_ms = base_tick_ms = None
+    for workers in worker_counts:
+        ms, serial_ms, tick_ms, state = run(data, workers, args.ticks)
+        if base_ms is None:
+            base_ms, base_serial_ms, base_tick_ms = ms, serial_ms, tick_ms
+        print(f"{workers:>7} {ms:>14.2f} {base_ms / ms:>8.2f} {serial_ms:>10.2f} {serial_ms / ms:>7.0%} {tick_ms:>8.2f}  "
+              f"{'same' if state == single_hash else 'DIFFERENT'}")
+    # Amdahl's law: with the parallel part taking no time at all, only the serial part is left
+    tick_serial_ms = base_tick_ms - (base_ms - base_serial_ms)
+    print(f"Serial at 1 worker: {base_serial_ms / base_ms:.0%} of collisions, {tick_serial_ms / base_tick_ms:.0%} "
+          f"of the tick, so at most {base_ms / base_serial_ms:.1f}x on collisions and "
+          f"{base_tick_ms / tick_serial_ms:.1f}x on the tick with any number of workers")
+    print(f"Old single-process loop, for reference: {single_ms:.2f} ms collisions, {single_tick_ms:.2f} ms tick")
+    if os.cpu_count() < max(worker_counts):
+        print(f"Only {os.cpu_count()} cores: worker counts above that share them and cannot scale")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# Seeded headless scenarios that sweep one knob at a time away from the
+# game's defaults: food, bots, bullets in flight and the spatial grid's
+# bucket size. Every scenario runs in a fresh process and reports ticks/s,
+# median ms/tick overall and per subsystem (see profiler.py), peak memory and the
+# final state hash, as a table and optionally as JSON. Given an earlier JSON
+# file, scenarios that got slower or bigger by more than the tolerance are
+# flagged and the exit status is 1. Each scenario runs a few times and the
+# fastest run counts, which keeps the numbers steady on a busy machine.
+#
+#   python -m bench.suite --output bench/baseline.json
+#   python -m bench.suite --compare bench/baseline.json [--sweep food bots] [--tolerance 0.1]
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from profiler import Profiler, WORLD_STAGES
+from simulation import World, ENEMY_COUNT, FOOD_COUNT, GRID_SIZE, TEAM_CODES
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows; peak memory is left out
+
+SEED = 1
+WARMUP_TICKS = 60
+TICKS = 300
+REPEAT = 3  # Runs per scenario; the fastest one is kept
+TOLERANCE = 0.20  # Relative slowdown or growth that counts as a regression
+NOISE_MS = 0.05  # Smaller changes in a time are noise, whatever the ratio
+
+DEFAULTS = {'food': FOOD_COUNT, 'bots': ENEMY_COUNT, 'bullets': 0, 'grid': GRID_SIZE}
+SWEEPS = {
+    'food': [1000, 3000, 10000, 30000, 100000],
+    'bots': [15, 50, 150, 400, 1000],
+    'bullets': [0, 100, 1000, 3000, 10000],
+    'grid': [25, 50, 100, 200, 400],
+}
+# The grid only matters on a busy world; the bucket size never changes the
+# outcome, so every grid scenario ends on the same state
+SWEEP_BASES = {'grid': {'food': 30000, 'bots': 400}}
+BULLET_SPEED = 300
+BULLET_DAMAGE = 1  # Enough to take the hit path without wiping out the bots
+BULLET_TEAM = len(TEAM_CODES)  # A team no cell is on, so every bullet can hit
+
+def scenarios(sweeps):
+    for sweep in sweeps:
+        for value in SWEEPS[sweep]:
+            yield f"{sweep}={value}", dict(DEFAULTS, **SWEEP_BASES.get(sweep, {}), **{sweep: value})
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # Bytes on macOS, KB elsewhere
+
+def top_up_bullets(world, count, rng):
+    # Keep count bullets in flight, fired from random points in random directions
+    missing = count - len(world.bullets)
+    if missing <= 0:
+        return
+    x = rng.uniform(0, world.width, missing)
+    y = rng.uniform(0, world.height, missing)
+    angle = rng.uniform(0, 2 * math.pi, missing)
+    for bullet in zip(x.tolist(), y.tolist(), (np.cos(angle) * BULLET_SPEED).tolist(),
+                      (np.sin(angle) * BULLET_SPEED).tolist()):
+        world.bullets.spawn(*bullet, BULLET_DAMAGE, 0, BULLET_TEAM)
+
+def run(task):
+    # One scenario, in its own process so peak memory is its own
+    params, warmup, ticks = task
+    world = World('classic', flags=['none'], seed=SEED, food_count=params['food'], enemy_count=params['bots'],
+                  grid_size=params['grid'])
+    world.start()
+    bullet_rng = np.random.default_rng(SEED)
+    for _ in range(warmup):
+        top_up_bullets(world, params['bullets'], bullet_rng)
+        world.step()
+
+    profiler = Profiler()
+    profiler.watch_world(world)
+    profiler.enable()
+    tick_ns = np.zeros(ticks, dtype=np.int64)
+    for tick in range(ticks):
+        top_up_bullets(world, params['bullets'], bullet_rng)  # Not part of the tick
+        start = time.perf_counter_ns()
+        world.step()
+        tick_ns[tick] = time.perf_counter_ns() - start
+    profiler.disable()
+
+    # Medians, so a tick that lost the CPU now and then moves nothing
+    subsystems = {stage: p50 for stage, (p50, _, _) in profiler.percentiles().items() if stage != 'tick'}
+    return {
+        'params': params,
+        'ticks_per_sec': ticks / (tick_ns.sum() / 1e9),
+        'ms_per_tick': float(np.median(tick_ns)) / 1e6,
+        'p95_tick_ms': float(np.percentile(tick_ns, 95)) / 1e6,
+        'subsystems_ms': subsystems,
+        'peak_rss_mb': peak_rss_mb(),
+        'cells': world.cell_count(),
+        'food': len(world.food),
+        'bullets': len(world.bullets),
+        'state_hash': world.state_hash(),
+    }
+
+def compare(results, baseline, tolerance):
+    # Lines describing every regression against the baseline results
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        # (what, new, old, smallest change that counts)
+        checks = [('ms/tick', result['ms_per_tick'], old['ms_per_tick'], NOISE_MS)]
+        checks += [(stage, ms, old['subsystems_ms'][stage], NOISE_MS) for stage, ms in result['subsystems_ms'].items()
+                   if stage in old['subsystems_ms']]
+        if result['peak_rss_mb'] and old.get('peak_rss_mb'):
+            checks.append(('peak MB', result['peak_rss_mb'], old['peak_rss_mb'], 0))
+        for what, new_value, old_value, noise in checks:
+            if old_value > 0 and new_value > old_value * (1 + tolerance) and new_value - old_value > noise:
+                regressions.append(f"{name}: {what} {old_value:.3f} -> {new_value:.3f} "
+                                   f"(+{(new_value / old_value - 1) * 100:.0f}%)")
+        if result['state_hash'] != old['state_hash']:
+            regressions.append(f"{name}: final state differs from the baseline (game behaviour changed)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sweep', nargs='+', choices=list(SWEEPS), default=list(SWEEPS))
+    parser.add_argument('--ticks', type=int, default=TICKS)
+    parser.add_argument('--warmup', type=int, default=WARMUP_TICKS)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output', metavar='FILE', help='Write the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='Flag regressions against earlier JSON results')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    stages = [stage for stage, _, _ in WORLD_STAGES if stage != 'tick']
+    print(f"{'scenario':<14} {'ticks/s':>8} {'ms/tick':>8} {'p95':>7} " +
+          " ".join(f"{stage[:10]:>10}" for stage in stages) + f" {'peak MB':>8}")
+    results = {}
+    # A new process per scenario keeps peak memory and warm caches apart
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for name, params in scenarios(args.sweep):
+            runs = [pool.apply(run, ((params, args.warmup, args.ticks),)) for _ in range(args.repeat)]
+            result = results[name] = min(runs, key=lambda run: run['ms_per_tick'])
+            peak = result['peak_rss_mb']
+            print(f"{name:<14} {result['ticks_per_sec']:>8.1f} {result['ms_per_tick']:>8.3f} "
+                  f"{result['p95_tick_ms']:>7.3f} " +
+                  " ".join(f"{result['subsystems_ms'].get(stage, 0):>10.3f}" for stage in stages) +
+                  f" {peak if peak is not None else float('nan'):>8.1f}", flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'machine': {'python': platform.python_version(), 'numpy': np.__version__,
+                            'platform': platform.platform(), 'cpus': os.cpu_count()},
+                'seed': SEED, 'warmup': args.warmup, 'ticks': args.ticks, 'repeat': args.repeat,
+                'scenarios': results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['ticks'] != args.ticks or baseline['warmup'] != args.warmup:
+            print("Baseline was run with different --ticks/--warmup; states will not match")
+        regressions = compare(results, baseline['scenarios'], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+if __name__ == '__main__':
+    main()
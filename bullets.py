@@ -0,0 +1,132 @@
+import numpy as np
+
+from spatial import expand_ranges
+
+# Bullets stored as a pool of parallel NumPy arrays. Dead slots go on a free
+# list and are handed out again by spawn(), so the arrays only ever grow to
+# the peak number of bullets in flight.
+
+BULLET_TYPES = ['gun', 'rpg']
+BULLET_RADII = [5, 10]
+
+# Per slot arrays of a BulletPool
+BULLET_ARRAYS = ('x', 'y', 'prev_x', 'prev_y', 'vx', 'vy', 'damage', 'radius', 'type', 'team', 'owner', 'alive')
+
+# Grid keys for the broad phase pack (x, y) bucket coordinates into one int
+KEY_OFFSET = 1 << 20
+KEY_STRIDE = 1 << 21
+
+class BulletPool:
+    def __init__(self, capacity=64):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)  # Position at the start of the tick, for interpolation
+        self.prev_y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.damage = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.type = np.zeros(capacity, dtype=np.int8)  # Index into BULLET_TYPES
+        self.team = np.zeros(capacity, dtype=np.int8)  # Team code of the shooter
+        self.owner = np.full(capacity, -1, dtype=np.int64)  # Id of the shooting cell
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))  # Stack, lowest slot on top
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        capacity = len(self.alive)
+        for name in BULLET_ARRAYS:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def spawn(self, x, y, vx, vy, damage, type, team, owner=-1):
+        if not self.free:
+            self.grow()
+        index = self.free.pop()
+        self.x[index] = self.prev_x[index] = x
+        self.y[index] = self.prev_y[index] = y
+        self.vx[index] = vx
+        self.vy[index] = vy
+        self.damage[index] = damage
+        self.type[index] = type
+        self.radius[index] = BULLET_RADII[type]
+        self.team[index] = team
+        self.owner[index] = owner
+        self.alive[index] = True
+        self.count += 1
+        return index
+
+    def kill(self, indices):
+        indices = indices[self.alive[indices]]
+        self.alive[indices] = False
+        self.free.extend(indices.tolist())
+        self.count -= len(indices)
+
+    def active(self):
+        return np.flatnonzero(self.alive)
+
+    def integrate(self, dt):
+        alive = self.alive
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+        np.add(self.x, self.vx * dt, out=self.x, where=alive)
+        np.add(self.y, self.vy * dt, out=self.y, where=alive)
+
+    def cull(self, width, height):
+        # Remove bullets that left the world
+        x, y = self.x, self.y
+        self.kill(np.flatnonzero(self.alive & ((x < 0) | (x > width) | (y < 0) | (y > height))))
+
+    def find_hits(self, cell_x, cell_y, cell_radius, cell_team, bucket_size):
+        # One broad-phase pass over every live bullet: cells are binned into
+        # every grid bucket their bounding box covers, each bullet looks up
+        # its own bucket, then a vectorized narrow phase keeps pairs where the
+        # bullet is inside the cell and the teams differ. Returns the bullet
+        # slots that hit and the index of the first cell each one hit.
+        bullets = self.active()
+        if not len(bullets) or not len(cell_x):
+            return bullets[:0], bullets[:0]
+
+        min_gx = np.floor((cell_x - cell_radius) / bucket_size).astype(np.int64)
+        min_gy = np.floor((cell_y - cell_radius) / bucket_size).astype(np.int64)
+        span_x = np.floor((cell_x + cell_radius) / bucket_size).astype(np.int64) - min_gx + 1
+        span_y = np.floor((cell_y + cell_radius) / bucket_size).astype(np.int64) - min_gy + 1
+        counts = span_x * span_y
+        cells = np.repeat(np.arange(len(cell_x)), counts)
+        local = expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+        gx = min_gx[cells] + local // span_y[cells]
+        gy = min_gy[cells] + local % span_y[cells]
+        keys = (gx + KEY_OFFSET) * KEY_STRIDE + (gy + KEY_OFFSET)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        cells = cells[order]
+
+        bx = self.x[bullets]
+        by = self.y[bullets]
+        bullet_keys = ((np.floor(bx / bucket_size).astype(np.int64) + KEY_OFFSET) * KEY_STRIDE +
+                       np.floor(by / bucket_size).astype(np.int64) + KEY_OFFSET)
+        start = np.searchsorted(keys, bullet_keys, 'left')
+        found = np.searchsorted(keys, bullet_keys, 'right') - start
+        pair_bullets = np.repeat(np.arange(len(bullets)), found)
+        pair_cells = cells[expand_ranges(start, found)]
+
+        dx = bx[pair_bullets] - cell_x[pair_cells]
+        dy = by[pair_bullets] - cell_y[pair_cells]
+        hit = ((dx * dx + dy * dy < cell_radius[pair_cells] ** 2) &
+               (self.team[bullets][pair_bullets] != cell_team[pair_cells]))
+        pair_bullets = pair_bullets[hit]
+        pair_cells = pair_cells[hit]
+        hit_bullets, first = np.unique(pair_bullets, return_index=True)
+        return bullets[hit_bullets], pair_cells[first]
+
+    def visible(self, left, top, width, height):
+        r = self.radius
+        return np.flatnonzero(
+            self.alive &
+            (self.x + r >= left) & (self.x - r <= left + width) &
+            (self.y + r >= top) & (self.y - r <= top + height)
+        )
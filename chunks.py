@@ -0,0 +1,122 @@
+import math
+
+import numpy as np
+
+# Large worlds are split into square chunks. A chunk's food is generated the
+# first time a cell comes near it, from a generator keyed by the chunk's
+# coordinates, so the layout depends on the seed alone and not on where
+# anyone went first. Chunks with no cell nearby are dormant: their food
+# stays where it is and their respawn timers stand still, then jump ahead by
+# the time they slept when a cell comes back. Only awake chunks cost
+# anything per tick, so a 50,000 x 50,000 world runs about as fast as a
+# small one with the same number of cells.
+
+CHUNK_SIZE = 1000
+WAKE_DISTANCE = 1  # Chunks around the ones a cell touches that stay awake
+WAKE_INTERVAL = 30  # Ticks between passes over which chunks are awake
+
+# One generated chunk and its block of food slots
+class Chunk:
+    def __init__(self, key, start, count):
+        self.key = key  # (column, row)
+        self.start = start
+        self.count = count
+        self.awake = True
+        self.slept_at = 0.0  # World time it went dormant
+
+    @property
+    def slots(self):
+        return slice(self.start, self.start + self.count)
+
+class ChunkManager:
+    def __init__(self, width, height, food_count, food, sequence):
+        self.width = width
+        self.height = height
+        self.columns = math.ceil(width / CHUNK_SIZE)
+        self.rows = math.ceil(height / CHUNK_SIZE)
+        self.density = food_count / (width * height)  # Pellets per square pixel
+        self.food = food
+        self.sequence = sequence  # Chunk generators are keyed children of this
+        self.chunks = {}  # (column, row) -> Chunk, for every chunk generated so far
+        self.awake = np.zeros(0, dtype=bool)  # Per food slot
+
+    def bounds(self, key):
+        column, row = key
+        left = column * CHUNK_SIZE
+        top = row * CHUNK_SIZE
+        return left, top, min(left + CHUNK_SIZE, self.width), min(top + CHUNK_SIZE, self.height)
+
+    def food_in(self, key):
+        left, top, right, bottom = self.bounds(key)
+        return round(self.density * (right - left) * (bottom - top))
+
+    def keys_near(self, x, y, reach):
+        # Chunks within reach of the points, plus WAKE_DISTANCE around them
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        reach = np.broadcast_to(np.asarray(reach, dtype=float), x.shape)
+        first_column = np.clip((x - reach) // CHUNK_SIZE - WAKE_DISTANCE, 0, self.columns - 1).astype(int)
+        last_column = np.clip((x + reach) // CHUNK_SIZE + WAKE_DISTANCE, 0, self.columns - 1).astype(int)
+        first_row = np.clip((y - reach) // CHUNK_SIZE - WAKE_DISTANCE, 0, self.rows - 1).astype(int)
+        last_row = np.clip((y + reach) // CHUNK_SIZE + WAKE_DISTANCE, 0, self.rows - 1).astype(int)
+        keys = set()
+        for ranges in set(zip(first_column.tolist(), last_column.tolist(), first_row.tolist(), last_row.tolist())):
+            for column in range(ranges[0], ranges[1] + 1):
+                for row in range(ranges[2], ranges[3] + 1):
+                    keys.add((column, row))
+        return sorted(keys)
+
+    def wake(self, keys, time):
+        # Wake the chunks, generating the ones never seen before; returns the
+        # slots of the food that appeared
+        new = [key for key in keys if key not in self.chunks]
+        for key in keys:
+            chunk = self.chunks.get(key)
+            if chunk is not None and not chunk.awake:
+                chunk.awake = True
+                # Catch the respawn timers up; update() respawns what is due
+                slots = chunk.slots
+                np.subtract(self.food.respawn_timer[slots], time - chunk.slept_at,
+                            out=self.food.respawn_timer[slots], where=~self.food.alive[slots])
+                self.awake[slots] = True
+        return self.generate(new)
+
+    def generate(self, keys):
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        food = self.food
+        counts = [self.food_in(key) for key in keys]
+        bounds = np.repeat(np.array([self.bounds(key) for key in keys]).reshape(-1, 4), counts, axis=0)
+        slots = food.allocate(sum(counts), *bounds.T)
+        self.awake = np.concatenate((self.awake, np.ones(len(slots), dtype=bool)))
+        start = int(slots[0]) if len(slots) else len(food.x)
+        for key, count in zip(keys, counts):
+            self.chunks[key] = Chunk(key, start, count)
+            rng = np.random.default_rng(np.random.SeedSequence(
+                self.sequence.entropy, spawn_key=self.sequence.spawn_key + key))
+            left, top, right, bottom = self.bounds(key)
+            food.x[start:start + count] = rng.integers(left, right, count, endpoint=True)
+            food.y[start:start + count] = rng.integers(top, bottom, count, endpoint=True)
+            start += count
+        food.alive[slots] = True
+        return slots
+
+    def refresh(self, x, y, reach, time):
+        # Keep the chunks near the given cells awake and let the rest sleep;
+        # returns the slots of the food that appeared
+        keys = self.keys_near(x, y, reach)
+        wanted = set(keys)
+        for key, chunk in self.chunks.items():
+            if chunk.awake and key not in wanted:
+                chunk.awake = False
+                chunk.slept_at = time
+                self.awake[chunk.slots] = False
+        return self.wake(keys, time)
+
+    def awake_chunks(self):
+        return [chunk for chunk in self.chunks.values() if chunk.awake]
+
+    def clamp_view(self, left, top, width, height):
+        # Top left corner of a view rectangle kept inside the world
+        return (max(0, min(left, self.width - width)),
+                max(0, min(top, self.height - height)))
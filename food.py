@@ -0,0 +1,83 @@
+import numpy as np
+
+# Food pellets stored as parallel NumPy arrays instead of one object each.
+# A pellet is identified by its slot index; eaten pellets stay in their slot
+# with a respawn timer until they reappear somewhere else in their region.
+# Slots are added in blocks as the world generates food (see chunks.py).
+
+FOOD_RADIUS = 4
+FOOD_ARRAYS = ('x', 'y', 'respawn_timer', 'alive', 'left', 'top', 'right', 'bottom')
+
+class FoodStore:
+    def __init__(self, respawn_time, rng=None):
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.respawn_timer = np.zeros(0)
+        self.alive = np.zeros(0, dtype=bool)
+        # Region each pellet respawns in
+        self.left = np.zeros(0, dtype=np.int64)
+        self.top = np.zeros(0, dtype=np.int64)
+        self.right = np.zeros(0, dtype=np.int64)
+        self.bottom = np.zeros(0, dtype=np.int64)
+        self.radius = np.zeros(0)
+        self.mass = np.zeros(0)
+        self.respawn_time = respawn_time
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+
+    def allocate(self, count, left, top, right, bottom):
+        # Add count dead slots that respawn inside the given region; returns
+        # their indices. The caller places them or lets them respawn.
+        start = len(self.x)
+        for name in FOOD_ARRAYS:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate((array, np.zeros(count, dtype=array.dtype))))
+        for name, value in zip(('left', 'top', 'right', 'bottom'), (left, top, right, bottom)):
+            getattr(self, name)[start:] = value
+        self.resized()
+        return np.arange(start, start + count)
+
+    def resized(self):
+        # Recompute the derived arrays after the slot arrays were replaced
+        self.radius = np.full(len(self.x), float(FOOD_RADIUS))
+        self.mass = self.radius ** 2
+
+    def respawn_ready(self, awake=None):
+        # Bring back every dead pellet whose timer ran out, at a new random
+        # position in its region; returns their indices. Only slots set in
+        # awake are considered.
+        ready = ~self.alive & (self.respawn_timer <= 0)
+        if awake is not None:
+            ready &= awake
+        ready = np.flatnonzero(ready)
+        if len(ready):
+            self.x[ready] = self.rng.integers(self.left[ready], self.right[ready], endpoint=True)
+            self.y[ready] = self.rng.integers(self.top[ready], self.bottom[ready], endpoint=True)
+            self.respawn_timer[ready] = 0
+            self.alive[ready] = True
+        return ready
+
+    def update(self, dt, awake=None):
+        # One masked decrement for every respawn timer
+        waiting = ~self.alive
+        if awake is not None:
+            waiting &= awake
+        np.subtract(self.respawn_timer, dt, out=self.respawn_timer, where=waiting)
+        return self.respawn_ready(awake)
+
+    def eat(self, candidates, x, y, radius):
+        # Batched distance test of candidate pellets against a cell; the ones
+        # inside it are eaten and their indices returned
+        dx = self.x[candidates] - x
+        dy = self.y[candidates] - y
+        eaten = candidates[dx * dx + dy * dy < radius * radius]
+        eaten = eaten[self.alive[eaten]]
+        self.take(eaten)
+        return eaten
+
+    def take(self, eaten):
+        # Pellets leave the world and start their respawn timers
+        self.alive[eaten] = False
+        self.respawn_timer[eaten] = self.respawn_time
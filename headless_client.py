@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from interest import ViewState, to_world
+from protocol import (
+    FrameReader, json_frame, encode_input, encode_ack,
+    WELCOME, DELTA, STATUS, CELL_INFO, JOIN
+)
+from server import DEFAULT_PORT
+from simulation import PlayerInput, MODES, WORLD_WIDTH
+
+# Headless network client that plays like a simple bot, and a load test
+# that runs many of them against a server on this machine.
+#
+#   python agario.py loadtest --clients 100 --duration 30 --spawn-server
+
+WANDER_DISTANCE = 300  # How far from its cells a client picks targets
+RETARGET_CHANCE = 0.05  # Per state chance of picking a new target
+SPLIT_CHANCE = 0.01
+SHOOT_CHANCE = 0.05
+CONNECT_INTERVAL = 0.01  # Seconds between client connections, so joins do not arrive at once
+
+# What one client received and sent
+class ClientStats:
+    def __init__(self):
+        self.states = 0
+        self.bytes_in = 0
+        self.inputs = 0
+        self.joins = 0
+        self.cells_seen = 0
+
+class HeadlessClient(asyncio.Protocol):
+    def __init__(self, name, rng):
+        self.name = name
+        self.rng = rng
+        self.transport = None
+        self.reader = FrameReader()
+        self.player_id = None
+        self.world_size = None  # (width, height) from the server
+        self.names = {}  # Cell id -> (name, flag)
+        self.view = ViewState()
+        self.target = None
+        self.weapon = None
+        self.stats = ClientStats()
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.join()
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(exc)
+
+    def join(self):
+        self.stats.joins += 1
+        self.transport.write(json_frame(JOIN, {'name': self.name, 'flag': None, 'team': None}))
+
+    def data_received(self, data):
+        self.stats.bytes_in += len(data)
+        for message_type, payload in self.reader.feed(data):
+            if message_type == WELCOME:
+                welcome = json.loads(payload)
+                self.player_id = welcome['player']
+                self.world_size = (welcome['width'], welcome['height'])
+                self.target = None
+                self.view = ViewState()  # The server starts a new baseline too
+            elif message_type == CELL_INFO:
+                for cell_id, name, flag in json.loads(payload):
+                    self.names[cell_id] = (name, flag)
+            elif message_type == STATUS:
+                status = json.loads(payload)
+                if status['state'] == "game_over":
+                    self.join()
+                elif status['weapon_selection']:
+                    self.weapon = self.rng.choice(('gun', 'rpg'))
+            elif message_type == DELTA:
+                self.transport.write(encode_ack(self.view.apply(payload)))
+                self.on_state(*self.view.current())
+
+    def on_state(self, cells, bullets, food):
+        self.stats.states += 1
+        self.stats.cells_seen += len(cells)
+        own = [(x, y) for x, y, _, _, player in cells.values() if player == self.player_id]
+        if not own:
+            return
+        x, y = to_world(sum(x for x, _ in own) / len(own), sum(y for _, y in own) / len(own), *self.world_size)
+        rng = self.rng
+        if self.target is None or rng.random() < RETARGET_CHANCE:
+            self.target = (x + rng.uniform(-WANDER_DISTANCE, WANDER_DISTANCE),
+                           y + rng.uniform(-WANDER_DISTANCE, WANDER_DISTANCE))
+        player_input = PlayerInput(
+            target=self.target,
+            split=rng.random() < SPLIT_CHANCE,
+            shoot=rng.random() < SHOOT_CHANCE,
+            weapon=self.weapon
+        )
+        self.weapon = None
+        self.transport.write(encode_input(player_input))
+        self.stats.inputs += 1
+
+async def run_clients(host, port, count, duration, seed):
+    loop = asyncio.get_running_loop()
+    clients = []
+    for index in range(count):
+        client = HeadlessClient(f"Load{index}", random.Random(seed + index))
+        await loop.create_connection(lambda: client, host, port)
+        clients.append(client)
+        await asyncio.sleep(CONNECT_INTERVAL)
+    # Measure only once everyone is connected and playing
+    before = [(client.stats.states, client.stats.bytes_in) for client in clients]
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    results = [(client.stats.states - states, client.stats.bytes_in - bytes_in, client)
+               for client, (states, bytes_in) in zip(clients, before)]
+    for client in clients:
+        client.transport.close()
+    return results, elapsed
+
+async def wait_for_port(host, port, timeout=10):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='agario.py loadtest', description='Load-test a server with headless clients.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to measure for')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn-server', action='store_true', help='Start a server process for the test')
+    parser.add_argument('--mode', choices=MODES, default='classic', help='Mode of the spawned server')
+    parser.add_argument('--world-size', type=int, default=WORLD_WIDTH, help='World size of the spawned server')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn_server:
+        server = subprocess.Popen([sys.executable, 'server.py', '--host', args.host, '--port', str(args.port),
+                                   '--mode', args.mode, '--seed', str(args.seed),
+                                   '--world-size', str(args.world_size)])
+    try:
+        if server:
+            asyncio.run(wait_for_port(args.host, args.port))
+        results, elapsed = asyncio.run(run_clients(args.host, args.port, args.clients, args.duration, args.seed))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    rates = [states / elapsed for states, _, _ in results]
+    kilobytes = [bytes_in / elapsed / 1024 for _, bytes_in, _ in results]
+    print(f"{len(results)} clients for {elapsed:.1f}s")
+    print(f"States per client: {statistics.mean(rates):.1f}/s mean, {min(rates):.1f}/s min")
+    print(f"Download per client: {statistics.mean(kilobytes):.1f} KB/s mean, {max(kilobytes):.1f} KB/s max")
+    print(f"Rejoins after dying: {sum(client.stats.joins - 1 for _, _, client in results)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import numpy as np
+
+from protocol import (
+    frame, DELTA, DELTA_HEADER, SECTION_HEADER, REMOVED_DTYPE, SECTIONS, COORDINATE_MAX, RADIUS_SCALE,
+    CELL_RECORD, BULLET_RECORD, FOOD_RECORD
+)
+from simulation import PlayerCell, TEAM_CODES
+
+# Interest management for networked viewers. Each viewer only hears about
+# what is inside its camera rectangle, found with the world's spatial grids,
+# so what a client receives depends on how busy its screen is and not on the
+# size of the world or the amount of food in it.
+#
+# Every update is a delta against the last snapshot the viewer acknowledged:
+# the ids that left the view plus the full record of everything that
+# entered or changed. Positions are quantized to 16 bits, so food that does
+# not move costs nothing after it is first sent, and an unacknowledged or
+# skipped update is never needed later.
+
+VIEW_WIDTH, VIEW_HEIGHT = 1200, 800  # The client's screen size
+VIEW_MARGIN = 64  # Extra border, so cells do not pop in at the screen edge
+MAX_UNACKED = 64  # Snapshots kept for a viewer that does not acknowledge
+
+# Cells, bullets and food of the empty baseline. Cells are id -> record
+# dicts; bullets and food, which can run into the thousands on one screen,
+# are record arrays sorted by id.
+EMPTY = ({}, np.zeros(0, BULLET_RECORD), np.zeros(0, FOOD_RECORD))
+
+def quantize(x, y, width, height):
+    # World coordinate arrays to 16-bit ints across a world of the given size
+    return (np.clip(np.rint(x * (COORDINATE_MAX / width)), 0, COORDINATE_MAX).astype(np.int64),
+            np.clip(np.rint(y * (COORDINATE_MAX / height)), 0, COORDINATE_MAX).astype(np.int64))
+
+def to_world(x, y, width, height):
+    return x * width / COORDINATE_MAX, y * height / COORDINATE_MAX
+
+def record_array(record, ids, *fields):
+    # Record array from parallel field arrays, ids ascending
+    order = np.argsort(ids)
+    array = np.empty(len(ids), record)
+    array['id'] = ids[order]
+    for name, values in zip(record.names[1:], fields):
+        array[name] = values[order]
+    return array
+
+def diff_records(current, previous):
+    # Ids in previous but not in current, and the current records that are
+    # new or changed; both arrays are sorted by id
+    if not len(current) or not len(previous):
+        return previous['id'], current
+    current_ids = current['id']
+    previous_ids = previous['id']
+    index = np.searchsorted(current_ids, previous_ids).clip(max=len(current) - 1)
+    removed = previous_ids[current_ids[index] != previous_ids]
+    index = np.searchsorted(previous_ids, current_ids).clip(max=len(previous) - 1)
+    return removed, current[previous[index] != current]
+
+def diff_cells(current, previous):
+    removed = [cell_id for cell_id in previous if cell_id not in current]
+    updated = [(cell_id,) + values for cell_id, values in current.items() if previous.get(cell_id) != values]
+    return np.array(removed, REMOVED_DTYPE), np.array(updated, CELL_RECORD)
+
+# What every viewer's update is built from, computed once per broadcast
+class ViewFrame:
+    def __init__(self, world):
+        self.world = world
+        self.tick = world.tick
+        count = world.cell_count()
+        x, y = quantize(*world.cell_positions(), world.width, world.height)
+        radius = np.fromiter((cell.radius for cell in world.all_cells()), dtype=float, count=count)
+        radius = np.clip(np.rint(radius * RADIUS_SCALE), 0, COORDINATE_MAX).astype(np.int64)
+        # Cell id -> record, without the id
+        self.cells = {
+            cell.id: (cell_x, cell_y, cell_radius, TEAM_CODES[cell.team],
+                      cell.player_id if isinstance(cell, PlayerCell) else -1)
+            for cell, cell_x, cell_y, cell_radius in zip(world.all_cells(), x.tolist(), y.tolist(), radius.tolist())
+        }
+
+class Viewer:
+    def __init__(self, width=VIEW_WIDTH, height=VIEW_HEIGHT):
+        self.width = width + 2 * VIEW_MARGIN
+        self.height = height + 2 * VIEW_MARGIN
+        self.center = None  # Middle of the world until the player has a cell
+        self.sequence = 0
+        self.acked = 0  # Newest snapshot the client has; 0 is the empty baseline
+        self.sent = {}  # Sequence -> snapshot, from the acknowledged one on
+        self.named = set()  # Cells whose name and flag the client has
+
+    def ack(self, sequence):
+        if sequence > self.acked and sequence in self.sent:
+            self.acked = sequence
+            for old in [old for old in self.sent if old < sequence]:
+                del self.sent[old]
+
+    def rectangle(self, world, player):
+        # Follow the player's first cell like the client's camera does, and
+        # stay where it was once the player has no cells
+        cells = world.cells_of(player.id) if player is not None else []
+        if cells:
+            self.center = (cells[0].pos[0], cells[0].pos[1])
+        elif self.center is None:
+            self.center = (world.width / 2, world.height / 2)
+        left, top = world.chunks.clamp_view(self.center[0] - VIEW_WIDTH / 2, self.center[1] - VIEW_HEIGHT / 2,
+                                            VIEW_WIDTH, VIEW_HEIGHT)
+        return left - VIEW_MARGIN, top - VIEW_MARGIN
+
+    def snapshot(self, view_frame, player):
+        # (cells, bullets, food) in view, see EMPTY
+        world = view_frame.world
+        left, top = self.rectangle(world, player)
+        right = left + self.width
+        bottom = top + self.height
+
+        # The hash stores centers, so widen the cell query by the largest radius
+        reach = world.max_cell_radius
+        records = view_frame.cells
+        cells = {}
+        for bucket in world.cell_hash.buckets_in(left - reach, top - reach, right + reach, bottom + reach):
+            for cell in bucket:
+                x, y = cell.pos
+                radius = cell.radius
+                if x + radius >= left and x - radius <= right and y + radius >= top and y - radius <= bottom:
+                    cells[cell.id] = records[cell.id]
+
+        bullet_pool = world.bullets
+        slots = bullet_pool.visible(left, top, self.width, self.height)
+        bullets = record_array(BULLET_RECORD, slots,
+                              *quantize(bullet_pool.x[slots], bullet_pool.y[slots], world.width, world.height),
+                              bullet_pool.type[slots])
+
+        food_store = world.food
+        slots = world.food_in_view(left, top, self.width, self.height)
+        food = record_array(FOOD_RECORD, slots,
+                            *quantize(food_store.x[slots], food_store.y[slots], world.width, world.height))
+        return cells, bullets, food
+
+    def update(self, view_frame, player):
+        # Names of newly seen cells, and the DELTA frame for this broadcast
+        state = self.snapshot(view_frame, player)
+        baseline = self.sent.get(self.acked, EMPTY)
+        self.sequence += 1
+        self.sent[self.sequence] = state
+        if len(self.sent) > MAX_UNACKED:
+            del self.sent[min(sequence for sequence in self.sent if sequence != self.acked)]
+
+        parts = [DELTA_HEADER.pack(self.sequence, self.acked, view_frame.tick)]
+        for diff, current, previous in zip((diff_cells, diff_records, diff_records), state, baseline):
+            removed, updated = diff(current, previous)
+            parts.append(SECTION_HEADER.pack(len(removed), len(updated)))
+            parts.append(removed.astype(REMOVED_DTYPE).tobytes())
+            parts.append(updated.tobytes())
+
+        cells = state[0]
+        new_cells = [cell_id for cell_id in cells if cell_id not in self.named]
+        self.named.update(new_cells)
+        if len(self.named) > 2 * len(cells) + 64:
+            self.named.intersection_update(view_frame.cells)  # Forget cells that left the world
+        world = view_frame.world
+        names = []
+        for cell_id in new_cells:
+            cell = world.find_cell(cell_id)
+            names.append([cell_id, cell.name, cell.flag])
+        return names, frame(DELTA, b''.join(parts))
+
+# Client side: rebuilds snapshots from deltas
+class ViewState:
+    def __init__(self):
+        self.snapshots = {0: ({}, {}, {})}  # Sequence -> id -> record dicts
+        self.sequence = 0
+        self.tick = 0
+
+    def apply(self, payload):
+        # Apply a DELTA payload; returns its sequence number, to acknowledge
+        sequence, baseline, tick = DELTA_HEADER.unpack_from(payload)
+        offset = DELTA_HEADER.size
+        state = []
+        for previous, record in zip(self.snapshots[baseline], SECTIONS):
+            removed_count, updated_count = SECTION_HEADER.unpack_from(payload, offset)
+            offset += SECTION_HEADER.size
+            removed = np.frombuffer(payload, REMOVED_DTYPE, removed_count, offset)
+            offset += removed.nbytes
+            updated = np.frombuffer(payload, record, updated_count, offset)
+            offset += updated.nbytes
+            current = dict(previous)
+            for entity in removed.tolist():
+                del current[entity]
+            for values in updated.tolist():
+                current[values[0]] = values[1:]
+            state.append(current)
+        # Older snapshots can no longer be a baseline
+        for old in [old for old in self.snapshots if old < baseline]:
+            del self.snapshots[old]
+        self.snapshots[sequence] = tuple(state)
+        self.sequence = sequence
+        self.tick = tick
+        return sequence
+
+    def current(self):
+        # (cells, bullets, food) of the newest snapshot
+        return self.snapshots[self.sequence]
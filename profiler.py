@@ -0,0 +1,122 @@
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+# Frame profiler. Stages are timed by swapping a function for a wrapper that
+# takes perf_counter_ns() around the call; disabling the profiler puts the
+# original functions back, so with it off nothing on the hot path changes.
+# Every stage keeps its last WINDOW durations for rolling percentiles, and
+# while tracing every span is also kept as a Chrome trace event (open the
+# file in chrome://tracing or https://ui.perfetto.dev).
+#
+#   profiler = Profiler()
+#   profiler.watch(world, 'check_collisions')
+#   profiler.enable()
+#   ...
+#   profiler.percentiles()    # {stage: (p50, p95, p99) in ms}
+#   profiler.save_trace('frames.json')
+
+WINDOW = 600  # Samples per stage, ten seconds at 60 FPS
+PERCENTILES = (50, 95, 99)
+MAX_TRACE_EVENTS = 1_000_000  # Spans kept for the trace; older ones are dropped
+
+# The simulation stages of one World tick
+WORLD_STAGES = (
+    ('tick', None, 'step'),
+    ('ai', 'bot_ai', 'step'),
+    ('update_food', None, 'update_food'),
+    ('update_cell_hash', None, 'update_cell_hash'),
+    ('handle_bullets', None, 'handle_bullets'),
+    ('check_collisions', None, 'check_collisions'),
+    ('remove_dead_cells', None, 'remove_dead_cells'),
+)
+
+class Profiler:
+    def __init__(self, tracing=False):
+        self.enabled = False
+        self.tracing = tracing
+        self.watched = {}  # Stage -> (object, attribute, original function, set on the object itself)
+        self.samples = {}  # Stage -> durations in ns, newest last
+        self.events = deque(maxlen=MAX_TRACE_EVENTS)  # (stage, start ns, duration ns)
+        self.origin = time.perf_counter_ns()
+
+    def watch(self, target, attribute, stage=None):
+        # Time every call to target.attribute as stage while enabled; watching
+        # a stage again moves it to the new target
+        stage = stage or attribute
+        self.unwatch(stage)
+        self.watched[stage] = (target, attribute, getattr(target, attribute),
+                               attribute in getattr(target, '__dict__', {}))
+        self.samples.setdefault(stage, deque(maxlen=WINDOW))
+        if self.enabled:
+            self.install(stage)
+
+    def unwatch(self, stage):
+        if stage in self.watched:
+            if self.enabled:
+                self.uninstall(stage)
+            del self.watched[stage]
+
+    def watch_world(self, world):
+        for stage, owner, attribute in WORLD_STAGES:
+            self.watch(getattr(world, owner) if owner else world, attribute, stage)
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            for stage in self.watched:
+                self.install(stage)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            for stage in self.watched:
+                self.uninstall(stage)
+
+    def install(self, stage):
+        target, attribute, function, _ = self.watched[stage]
+        samples = self.samples[stage]
+        events = self.events if self.tracing else None
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                samples.append(elapsed)
+                if events is not None:
+                    events.append((stage, start, elapsed))
+        setattr(target, attribute, timed)
+
+    def uninstall(self, stage):
+        target, attribute, function, own = self.watched[stage]
+        if own:
+            setattr(target, attribute, function)
+        else:
+            delattr(target, attribute)  # A method: the class one shows through again
+
+    def percentiles(self):
+        # {stage: (p50, p95, p99)} in ms over the last WINDOW calls
+        return {stage: tuple((np.percentile(np.fromiter(samples, dtype=np.int64, count=len(samples)),
+                                            PERCENTILES) / 1e6).tolist())
+                for stage, samples in self.samples.items() if samples}
+
+    def totals(self):
+        # {stage: (calls, total ms)} over the last WINDOW calls
+        return {stage: (len(samples), sum(samples) / 1e6) for stage, samples in self.samples.items()}
+
+    def reset(self):
+        for samples in self.samples.values():
+            samples.clear()
+        self.events.clear()
+
+    def save_trace(self, path):
+        # Chrome trace event format: complete events, times in microseconds
+        events = [{'name': stage, 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': (start - self.origin) / 1000,
+                   'dur': elapsed / 1000} for stage, start, elapsed in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
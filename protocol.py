@@ -0,0 +1,102 @@
+import json
+import math
+import struct
+
+import numpy as np
+
+from simulation import PlayerInput, WEAPONS
+
+# Wire format shared by the dedicated server and its clients. Every message
+# is a frame: payload length, message type, payload. Inputs and world state
+# are packed binary; the rare messages (joining, cell names) are JSON. What
+# goes into a client's state updates is decided in interest.py.
+
+FRAME = struct.Struct('<IB')  # payload length, message type
+MAX_FRAME = 1 << 24  # Larger frames mean a broken or hostile peer
+
+# Client to server
+JOIN = 1  # JSON {name, flag, team}
+INPUT = 2  # INPUT_FORMAT
+ACK = 8  # ACK_FORMAT: the newest DELTA the client has applied
+# Server to client
+WELCOME = 3  # JSON {player, mode, width, height, tick_rate, send_rate}
+STATUS = 5  # JSON {state, weapon_selection}
+CELL_INFO = 6  # JSON [[id, name, flag], ...] for cells the client has not seen yet
+DELTA = 7  # DELTA_HEADER, then a section each for cells, bullets and food
+
+INPUT_FORMAT = struct.Struct('<ffBB')  # target x, target y, buttons, weapon
+SPLIT = 1
+SHOOT = 2
+TOGGLE_LOCK = 4
+HAS_TARGET = 8
+INPUT_WEAPONS = [None] + [weapon for weapon in WEAPONS if weapon != 'none']
+
+ACK_FORMAT = struct.Struct('<I')
+
+# A DELTA takes the client from the baseline snapshot it acknowledged to a
+# new one. Each section lists the ids that left the view, then the full
+# record of every entity that entered it or changed. Coordinates are
+# quantized to 16 bits across the world, radii to 1/RADIUS_SCALE pixels.
+DELTA_HEADER = struct.Struct('<III')  # snapshot sequence, baseline sequence (0: empty), tick
+SECTION_HEADER = struct.Struct('<II')  # ids removed, records updated
+REMOVED_DTYPE = np.dtype('<u4')
+CELL_RECORD = np.dtype([('id', '<u4'), ('x', '<u2'), ('y', '<u2'), ('radius', '<u2'),
+                        ('team', 'u1'), ('player', '<i4')])  # player is -1 for bots
+BULLET_RECORD = np.dtype([('id', '<u4'), ('x', '<u2'), ('y', '<u2'), ('type', 'u1')])  # id is the pool slot
+FOOD_RECORD = np.dtype([('id', '<u4'), ('x', '<u2'), ('y', '<u2')])  # id is the food slot
+SECTIONS = (CELL_RECORD, BULLET_RECORD, FOOD_RECORD)
+COORDINATE_MAX = 0xffff
+RADIUS_SCALE = 8
+
+def frame(message_type, payload):
+    return FRAME.pack(len(payload), message_type) + payload
+
+def json_frame(message_type, value):
+    return frame(message_type, json.dumps(value, separators=(',', ':')).encode())
+
+# Splits a byte stream back into (message type, payload) frames
+class FrameReader:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME.size:
+            length, message_type = FRAME.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME:
+                raise ValueError(f"Frame of {length} bytes is too large")
+            end = offset + FRAME.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((message_type, bytes(self.buffer[offset + FRAME.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
+
+def encode_input(player_input):
+    buttons = player_input.split * SPLIT | player_input.shoot * SHOOT | player_input.toggle_lock * TOGGLE_LOCK
+    x = y = 0.0
+    if player_input.target is not None:
+        buttons |= HAS_TARGET
+        x, y = player_input.target
+    return frame(INPUT, INPUT_FORMAT.pack(x, y, buttons, INPUT_WEAPONS.index(player_input.weapon)))
+
+def decode_input(payload):
+    x, y, buttons, weapon = INPUT_FORMAT.unpack(payload)
+    if buttons & HAS_TARGET and not (math.isfinite(x) and math.isfinite(y)):
+        raise ValueError("Input target is not a finite point")
+    return PlayerInput(
+        target=(x, y) if buttons & HAS_TARGET else None,
+        split=bool(buttons & SPLIT),
+        shoot=bool(buttons & SHOOT),
+        toggle_lock=bool(buttons & TOGGLE_LOCK),
+        weapon=INPUT_WEAPONS[weapon] if weapon < len(INPUT_WEAPONS) else None
+    )
+
+def encode_ack(sequence):
+    return frame(ACK, ACK_FORMAT.pack(sequence))
+
+def decode_ack(payload):
+    return ACK_FORMAT.unpack(payload)[0]
@@ -0,0 +1,70 @@
+# Live entities keyed by stable integer ids. Entities are kept densely packed
+# in a list for fast iteration, with an id -> position index for O(1)
+# membership and swap-remove deletion. Entities are also grouped by one of
+# their attributes (team, owning player, ...) in insertion-ordered id sets.
+#
+# kill() only marks an entity dead; it stays in the registry until flush()
+# so loops over the registry are never disturbed mid-tick.
+class EntityRegistry:
+    def __init__(self, group_by):
+        self.items = []
+        self.positions = {}  # Entity id -> index in items
+        self.group_by = group_by
+        self.groups = {}  # Group key -> {entity id: None}
+        self.dead = {}  # Entities killed since the last flush, by id
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, entity):
+        return entity.id in self.positions
+
+    def get(self, entity_id):
+        return self.items[self.positions[entity_id]]
+
+    def add(self, entity):
+        self.positions[entity.id] = len(self.items)
+        self.items.append(entity)
+        key = getattr(entity, self.group_by)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {}
+        group[entity.id] = None
+
+    def remove(self, entity):
+        # Swap the last entity into the hole instead of shifting the list
+        position = self.positions.pop(entity.id)
+        last = self.items.pop()
+        if last is not entity:
+            self.items[position] = last
+            self.positions[last.id] = position
+        key = getattr(entity, self.group_by)
+        group = self.groups[key]
+        del group[entity.id]
+        if not group:
+            del self.groups[key]
+
+    def kill(self, entity):
+        entity.alive = False
+        self.dead[entity.id] = entity
+
+    def flush(self):
+        # Remove everything killed since the last flush and return it
+        dead = list(self.dead.values())
+        self.dead.clear()
+        for entity in dead:
+            self.remove(entity)
+        return dead
+
+    def group(self, key):
+        group = self.groups.get(key)
+        if not group:
+            return []
+        return [self.items[self.positions[entity_id]] for entity_id in group]
+
+    def group_size(self, key):
+        group = self.groups.get(key)
+        return len(group) if group else 0
@@ -0,0 +1,279 @@
+import argparse
+import json
+import struct
+import sys
+import time
+import zlib
+
+from simulation import World, PlayerInput, WEAPONS, TICK_DT
+from snapshot import dump_snapshot, restore_snapshot
+
+# Match replays. A match is fully decided by its seed and the players'
+# inputs, so that is all a replay stores:
+#
+#   header   magic, version and a small JSON block: mode, seed, world
+#            settings, the players and the state hash at tick 0
+#   body     one zlib stream with a record per tick: a flag byte per player
+#            (split, shoot, lock toggle, weapon pick, target moved), the
+#            target as a varint delta when it moved, and for matches where
+#            the bots planned against a time budget, how many bots planned
+#   trailer  tick count and state hash at the end, to check playback against
+#
+# Targets are kept in quarter world pixels. The recorder feeds the rounded
+# targets to the live world too, so playback sees exactly what it saw.
+#
+#   python agario.py replay match.agr                  # re-simulate at full speed
+#   python agario.py replay match.agr --seek 9000      # jump around via keyframes
+
+REPLAY_MAGIC = b'AGRP'
+REPLAY_VERSION = 2
+TARGET_SCALE = 4  # Target precision: 1 / TARGET_SCALE world pixels
+KEYFRAME_INTERVAL = 600  # Ticks between playback keyframes (10 seconds)
+
+HEADER = struct.Struct('<4sBI')  # magic, version, JSON length
+TRAILER = struct.Struct('<I16s')  # ticks, final state hash
+
+# Bits of the per player flag byte
+SPLIT = 1
+SHOOT = 2
+TOGGLE_LOCK = 4
+TARGET = 8
+WEAPON_SHIFT = 4  # Two bits: index into REPLAY_WEAPONS
+REPLAY_WEAPONS = [None] + [weapon for weapon in WEAPONS if weapon != 'none']
+
+def write_varint(out, value):
+    # Zigzag, so small negative deltas stay small too
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    value = value >> 1 if not value & 1 else -(value >> 1) - 1
+    return value, offset
+
+# Writes a replay while the match is played. Create it right after
+# world.start() and advance the world through step() instead of world.step().
+class Recorder:
+    def __init__(self, world, path):
+        if world.tick != 0:
+            raise ValueError("Recording has to start before the first tick")
+        self.world = world
+        self.players = sorted(world.players.values(), key=lambda player: player.id)
+        self.budgeted = world.bot_ai.budget_ms is not None
+        self.targets = {player.id: (0, 0) for player in self.players}
+        self.ticks = 0
+        header = json.dumps({
+            'mode': world.mode,
+            'seed': str(world.seed),
+            'flags': world.flags,
+            'width': world.width,
+            'height': world.height,
+            'food_count': world.food_count,
+            'enemy_count': world.enemy_count,
+            'respawn_count': world.respawn_count,
+            'players': [[player.name, player.flag, player.team] for player in self.players],
+            'budgeted': self.budgeted,
+            'start_hash': world.state_hash(),
+        }, separators=(',', ':')).encode()
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, len(header)))
+        self.file.write(header)
+        self.compressor = zlib.compressobj(9)
+
+    def step(self, inputs=None):
+        inputs = inputs or {}
+        record = bytearray()
+        recorded = {}
+        for player in self.players:
+            player_input = inputs.get(player.id)
+            if player_input is None:
+                record.append(0)
+                continue
+            flags = (player_input.split * SPLIT | player_input.shoot * SHOOT |
+                     player_input.toggle_lock * TOGGLE_LOCK |
+                     REPLAY_WEAPONS.index(player_input.weapon) << WEAPON_SHIFT)
+            target = None
+            moved = None
+            if player_input.target is not None:
+                x = round(player_input.target[0] * TARGET_SCALE)
+                y = round(player_input.target[1] * TARGET_SCALE)
+                target = (x / TARGET_SCALE, y / TARGET_SCALE)
+                if (x, y) != self.targets[player.id]:
+                    flags |= TARGET
+                    last_x, last_y = self.targets[player.id]
+                    moved = (x - last_x, y - last_y)
+                    self.targets[player.id] = (x, y)
+            record.append(flags)
+            if moved:
+                write_varint(record, moved[0])
+                write_varint(record, moved[1])
+            recorded[player.id] = PlayerInput(target, player_input.split, player_input.shoot,
+                                              player_input.toggle_lock, player_input.weapon)
+
+        self.world.step(recorded)
+        if self.budgeted:
+            write_varint(record, self.world.bot_ai.stats.planned)
+        self.file.write(self.compressor.compress(bytes(record)))
+        self.ticks += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write(self.compressor.flush())
+        self.file.write(TRAILER.pack(self.ticks, bytes.fromhex(self.world.state_hash())))
+        self.file.close()
+
+# A loaded replay: the match settings and every tick's inputs
+class Replay:
+    def __init__(self, header, ticks, final_hash=None):
+        self.header = header
+        self.ticks = ticks  # (inputs or None, bots planned or None) per tick
+        self.final_hash = final_hash  # None if the recording was cut short
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def new_world(self):
+        # The world as it was when recording started
+        header = self.header
+        world = World(header['mode'], flags=header['flags'], food_count=header['food_count'],
+                      enemy_count=header['enemy_count'], seed=int(header['seed']),
+                      width=header['width'], height=header['height'])
+        world.respawn_count = header['respawn_count']
+        for name, flag, team in header['players']:
+            world.add_player(name, flag, team)
+        world.start()
+        if world.state_hash() != header['start_hash']:
+            raise ValueError("Replay was recorded with a different version of the game")
+        return world
+
+def load_replay(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, header_length = HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+    offset = HEADER.size
+    header = json.loads(data[offset:offset + header_length])
+    decompressor = zlib.decompressobj()
+    body = decompressor.decompress(data[offset + header_length:])
+
+    player_ids = range(len(header['players']))
+    budgeted = header['budgeted']
+    targets = [(0, 0)] * len(player_ids)
+    ticks = []
+    offset = 0
+    try:
+        while offset < len(body):
+            inputs = {}
+            for player_id in player_ids:
+                flags = body[offset]
+                offset += 1
+                if not flags:
+                    continue
+                target = None
+                if flags & TARGET:
+                    dx, offset = read_varint(body, offset)
+                    dy, offset = read_varint(body, offset)
+                    x, y = targets[player_id]
+                    targets[player_id] = (x + dx, y + dy)
+                    target = (targets[player_id][0] / TARGET_SCALE, targets[player_id][1] / TARGET_SCALE)
+                inputs[player_id] = PlayerInput(target, bool(flags & SPLIT), bool(flags & SHOOT),
+                                                bool(flags & TOGGLE_LOCK), REPLAY_WEAPONS[flags >> WEAPON_SHIFT])
+            planned = None
+            if budgeted:
+                planned, offset = read_varint(body, offset)
+            ticks.append((inputs or None, planned))
+    except IndexError:
+        pass  # Recording was cut off mid-tick; keep the whole ticks
+
+    final_hash = None
+    if decompressor.eof and len(decompressor.unused_data) == TRAILER.size:
+        tick_count, digest = TRAILER.unpack(decompressor.unused_data)
+        if tick_count == len(ticks):
+            final_hash = digest.hex()
+    return Replay(header, ticks, final_hash)
+
+# Plays a replay back headlessly, as fast as the simulation runs. With a
+# keyframe interval it keeps a snapshot of the world every that many ticks,
+# so seeking only ever re-simulates less than one interval.
+class ReplayPlayer:
+    def __init__(self, replay, keyframe_interval=None):
+        self.replay = replay
+        self.keyframe_interval = keyframe_interval
+        self.world = replay.new_world()
+        self.keyframes = {}
+        self.save_keyframe()
+
+    def save_keyframe(self):
+        if self.keyframe_interval and self.world.tick % self.keyframe_interval == 0:
+            if self.world.tick not in self.keyframes:
+                self.keyframes[self.world.tick] = dump_snapshot(self.world)
+
+    def step(self):
+        inputs, planned = self.replay.ticks[self.world.tick]
+        self.world.bot_ai.plan_quota = planned
+        self.world.step(inputs)
+        self.save_keyframe()
+
+    def seek(self, tick):
+        # Bring the world to the given tick, forwards or backwards
+        tick = max(0, min(tick, len(self.replay)))
+        if self.keyframe_interval:
+            keyframe = tick - tick % self.keyframe_interval
+            while keyframe not in self.keyframes:
+                keyframe -= self.keyframe_interval
+            if tick < self.world.tick or keyframe > self.world.tick:
+                self.world = restore_snapshot(self.keyframes[keyframe])
+        elif tick < self.world.tick:
+            self.world = self.replay.new_world()
+        while self.world.tick < tick:
+            self.step()
+        return self.world
+
+    def play(self):
+        return self.seek(len(self.replay))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='agario.py replay', description='Re-simulate a recorded match headlessly.')
+    parser.add_argument('path')
+    parser.add_argument('--seek', type=int, action='append', default=[], metavar='TICK',
+                        help='After playing through, jump to this tick (can be repeated)')
+    parser.add_argument('--keyframe-interval', type=int, default=KEYFRAME_INTERVAL,
+                        help='Ticks between keyframes, 0 for none')
+    args = parser.parse_args(argv)
+
+    replay = load_replay(args.path)
+    print(f"{args.path}: {replay.header['mode']}, {len(replay)} ticks "
+          f"({len(replay) * TICK_DT:.1f}s of play)")
+    start = time.perf_counter()
+    replay_player = ReplayPlayer(replay, args.keyframe_interval)
+    world = replay_player.play()
+    elapsed = time.perf_counter() - start
+    print(f"Played in {elapsed:.2f}s ({len(replay) / elapsed:.0f} ticks/s)")
+
+    for tick in args.seek:
+        start = time.perf_counter()
+        world = replay_player.seek(tick)
+        print(f"Seek to tick {world.tick}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if replay.final_hash is None:
+        print("Recording was cut short; nothing to check against")
+    elif replay_player.seek(len(replay)).state_hash() == replay.final_hash:
+        print("Final state matches the recording")
+    else:
+        print("Final state differs from the recording")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import random
+
+import numpy as np
+
+# Seeded random streams for the simulation. Every subsystem draws from its
+# own stream, all derived from one world seed, so a change in how often one
+# subsystem rolls the dice never shifts the numbers another one sees, and
+# the same seed plus the same inputs always replays the same match.
+
+STREAMS = ('spawn', 'cells', 'food', 'ai', 'zone')
+
+class RNGStreams:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy  # Fresh OS entropy
+        self.seed = seed
+        self.sequences = dict(zip(STREAMS, np.random.SeedSequence(seed).spawn(len(STREAMS))))
+
+    def numpy(self, name):
+        # NumPy generator for a stream, for the array-based subsystems
+        return np.random.default_rng(self.sequences[name])
+
+    def python(self, name):
+        # random.Random for a stream, for the code that picks one thing at a time
+        return random.Random(int(self.sequences[name].generate_state(1, np.uint64)[0]))
@@ -0,0 +1,105 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from simulation import World, MODES, TICK_DT
+
+# Batch runner for headless bot-only matches, used to tune weapons and
+# balance. Matches are independent, so they are spread over a process pool
+# and each one is reproducible from its seed.
+#
+#   python agario.py simulate --matches 100 --mode battle_royale --workers 8
+#
+# Every finished match is written as one JSON line to the results file.
+
+MAX_MATCH_TIME = 600  # Simulated seconds before a match is called
+MASS_SAMPLE_INTERVAL = 5  # Simulated seconds between mass curve samples
+
+def match_over(world):
+    if world.battle_royale_mode:
+        # Teammates cannot hurt each other, so the last team standing wins
+        return len(world.enemy_list.groups) <= 1
+    if world.teams_mode:
+        return world.game_timer <= 0
+    return False  # Classic matches run until MAX_MATCH_TIME
+
+def masses_by_bot(world, names):
+    # Total mass of each bot's cells, by lineage; names collects who is who,
+    # since several bots can carry the same name
+    masses = {}
+    for cell in world.enemy_list:
+        masses[cell.lineage] = masses.get(cell.lineage, 0) + cell.mass
+        names[cell.lineage] = cell.name
+    return masses
+
+def run_match(job):
+    index, seed, mode, bots, max_time = job
+    world = World(mode, enemy_count=bots, seed=seed)
+    world.start()
+
+    sample_ticks = max(1, round(MASS_SAMPLE_INTERVAL / TICK_DT))
+    curves = {}
+    names = {}
+    while world.time < max_time and not match_over(world):
+        world.step()
+        if world.tick % sample_ticks == 0:
+            for lineage, mass in masses_by_bot(world, names).items():
+                curves.setdefault(lineage, []).append(int(mass))
+
+    if world.teams_mode:
+        winner = winner_team = max(world.team_scores, key=world.team_scores.get)
+        winner_id = None
+    else:
+        masses = masses_by_bot(world, names)
+        winner_id = max(masses, key=masses.get) if masses else None
+        winner = names[winner_id] if winner_id is not None else None
+        winner_team = next(cell.team for cell in world.enemy_list
+                            if cell.lineage == winner_id) if winner_id is not None else None
+    names.update(world.killer_names)
+
+    return {
+        'match': index,
+        'seed': seed,
+        'mode': mode,
+        'winner': winner,
+        'winner_id': winner_id,
+        'winner_team': winner_team,
+        'duration': round(world.time, 3),
+        'ticks': world.tick,
+        # Bots are keyed by lineage id, the id of their first cell
+        'names': names,
+        'kills': world.kills,
+        'mass_interval': MASS_SAMPLE_INTERVAL,
+        'mass': curves,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='agario.py simulate', description='Run headless bot-only matches.')
+    parser.add_argument('--matches', type=int, default=10)
+    parser.add_argument('--mode', choices=MODES, default='battle_royale')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0, help='Match i uses seed + i')
+    parser.add_argument('--bots', type=int, default=None, help='Bots per match (default: the mode default)')
+    parser.add_argument('--max-time', type=float, default=MAX_MATCH_TIME, help='Simulated seconds per match at most')
+    parser.add_argument('--output', default='results.jsonl')
+    args = parser.parse_args(argv)
+
+    jobs = [(index, args.seed + index, args.mode, args.bots, args.max_time) for index in range(args.matches)]
+    start = time.perf_counter()
+    winners = {}
+    with open(args.output, 'w') as results, multiprocessing.Pool(args.workers) as pool:
+        for done, result in enumerate(pool.imap_unordered(run_match, jobs), 1):
+            results.write(json.dumps(result, separators=(',', ':')) + '\n')
+            winners[result['winner_team']] = winners.get(result['winner_team'], 0) + 1
+            print(f"[{done}/{args.matches}] match {result['match']}: {result['winner']} "
+                  f"({result['winner_team']}) after {result['duration']:.1f}s", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"{args.matches} matches in {elapsed:.1f}s on {args.workers} workers "
+          f"({args.matches / elapsed:.2f} matches/s), results in {args.output}")
+    print("Wins by team: " + ", ".join(f"{team}: {count}" for team, count in sorted(winners.items(), key=str)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Battle royale safe zone. The whole match is planned up front from a seed:
+# a list of equally long phases, each with a zone center, radius and storm
+# damage. Near the end of a phase the zone slides smoothly towards the next
+# one, so the zone at any time t is a closed-form lookup.
+
+SAFE_ZONE_SHRINK_INTERVAL = 20  # Time in seconds between shrinks
+SAFE_ZONE_SHRINK_TIME = 5  # The last seconds of each phase are spent shrinking
+SAFE_ZONE_SHRINK_STEP = 300  # Radius lost per phase
+SAFE_ZONE_MIN_RADIUS = 300
+SAFE_ZONE_DRIFT = 100  # Largest center move per phase along each axis
+SAFE_ZONE_DAMAGE = 5  # Storm damage per second, multiplied by the phase number
+
+class SafeZone:
+    def __init__(self, seed, width, height):
+        rng = np.random.default_rng(seed)
+        radii = [max(width, height) // 2]
+        while radii[-1] > SAFE_ZONE_MIN_RADIUS:
+            radii.append(max(SAFE_ZONE_MIN_RADIUS, radii[-1] - SAFE_ZONE_SHRINK_STEP))
+        # Each phase moves the center by a random drift, kept inside the world
+        drift = rng.integers(-SAFE_ZONE_DRIFT, SAFE_ZONE_DRIFT, (len(radii), 2), endpoint=True)
+        centers = np.empty((len(radii), 2))
+        centers[0] = (width // 2, height // 2)
+        for phase in range(1, len(centers)):
+            centers[phase] = np.clip(centers[phase - 1] + drift[phase], 0, (width, height))
+
+        self.radii = np.array(radii, dtype=float)
+        self.centers = centers
+        self.damage = SAFE_ZONE_DAMAGE * np.arange(1, len(radii) + 1, dtype=float)
+        self.interval = SAFE_ZONE_SHRINK_INTERVAL
+
+    def __len__(self):
+        return len(self.radii)
+
+    def phase(self, t):
+        return min(int(t // self.interval), len(self.radii) - 1)
+
+    def at(self, t):
+        # (center x, center y, radius, damage per second, phase) at time t
+        phase = self.phase(t)
+        cx, cy = self.centers[phase]
+        radius = self.radii[phase]
+        if phase + 1 < len(self.radii):
+            shrink_start = (phase + 1) * self.interval - SAFE_ZONE_SHRINK_TIME
+            if t > shrink_start:
+                f = (t - shrink_start) / SAFE_ZONE_SHRINK_TIME
+                next_x, next_y = self.centers[phase + 1]
+                cx += (next_x - cx) * f
+                cy += (next_y - cy) * f
+                radius += (self.radii[phase + 1] - radius) * f
+        return float(cx), float(cy), float(radius), float(self.damage[phase]), phase
+
+    def outside(self, t, x, y):
+        # Boolean mask of the points (x, y arrays) that are in the storm at time t
+        cx, cy, radius, _, _ = self.at(t)
+        dx = x - cx
+        dy = y - cy
+        return dx * dx + dy * dy > radius * radius
@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import sys
+import time
+
+from interest import Viewer, ViewFrame
+from protocol import (
+    FrameReader, json_frame, decode_input, decode_ack,
+    JOIN, INPUT, ACK, WELCOME, STATUS, CELL_INFO
+)
+from simulation import World, MODES, TICK_DT, TICK_RATE, WORLD_WIDTH, teams
+
+# Dedicated server: one authoritative World stepped at a fixed tick rate on
+# an asyncio loop. Clients connect over TCP, join as players and send their
+# inputs; the server merges whatever arrived between two ticks, steps the
+# world and every few ticks sends every client a delta of what is on its
+# screen (see interest.py).
+#
+#   python agario.py server --mode classic --port 9999
+#   python agario.py loadtest --clients 100    # headless clients, see headless_client.py
+
+DEFAULT_PORT = 9999
+SEND_RATE = 20  # State broadcasts per second
+AI_BUDGET_MS = 2  # Bot planning time per tick, as in the client
+MAX_CATCH_UP_TICKS = 5  # Drop time after a long stall instead of spiralling
+MAX_BUFFERED = 256 * 1024  # Skip state broadcasts to clients with this much unsent
+STATS_INTERVAL = 5  # Seconds between server stats lines
+MAX_NAME_LENGTH = 16
+
+# One connected client and the player it controls
+class ClientConnection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.reader = FrameReader()
+        self.player = None
+        self.profile = None  # (name, flag, team) the player joined with
+        self.input = None  # Inputs received since the last tick, merged
+        self.status = None  # Last (state, weapon selection) sent
+        self.viewer = Viewer()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.clients.add(self)
+
+    def data_received(self, data):
+        try:
+            for message_type, payload in self.reader.feed(data):
+                if message_type == JOIN:
+                    self.server.join(self, json.loads(payload))
+                elif message_type == INPUT and self.player is not None:
+                    self.queue_input(decode_input(payload))
+                elif message_type == ACK:
+                    self.viewer.ack(decode_ack(payload))
+        except (ValueError, TypeError, AttributeError, struct.error):
+            self.transport.close()  # Not speaking our protocol
+
+    def connection_lost(self, exc):
+        self.server.leave(self)
+
+    def queue_input(self, player_input):
+        # Keep the latest target; presses are kept until a tick consumes them.
+        # Targets are held to the world so no client can send cells flying
+        if player_input.target is not None:
+            world = self.server.world
+            x, y = player_input.target
+            player_input.target = min(max(x, 0.0), world.width), min(max(y, 0.0), world.height)
+        pending = self.input
+        if pending is None:
+            self.input = player_input
+            return
+        if player_input.target is not None:
+            pending.target = player_input.target
+        pending.split |= player_input.split
+        pending.shoot |= player_input.shoot
+        pending.toggle_lock |= player_input.toggle_lock
+        pending.weapon = player_input.weapon or pending.weapon
+
+    def take_input(self):
+        player_input = self.input
+        self.input = None
+        return player_input
+
+    def send(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+
+# What the server did since the last stats line
+class ServerStats:
+    def __init__(self):
+        self.ticks = 0
+        self.tick_ns = 0
+        self.max_tick_ns = 0
+        self.late_ticks = 0  # Ticks dropped after a stall
+        self.bytes_out = 0
+        self.skipped = 0  # Broadcasts skipped for slow clients
+
+class GameServer:
+    def __init__(self, mode='classic', seed=None, send_rate=SEND_RATE, ai_budget_ms=AI_BUDGET_MS,
+                 world_size=WORLD_WIDTH):
+        self.mode = mode
+        self.seed = seed
+        self.world_size = world_size
+        self.matches = 0
+        self.send_every = max(1, round(TICK_RATE / send_rate))
+        self.ai_budget_ms = ai_budget_ms
+        self.clients = set()
+        self.stats = ServerStats()
+        self.world = None
+        self.new_match()
+
+    def new_match(self):
+        seed = self.seed + self.matches if self.seed is not None else None
+        self.matches += 1
+        self.world = World(self.mode, ai_budget_ms=self.ai_budget_ms, seed=seed,
+                           width=self.world_size, height=self.world_size)
+        self.world.start()
+        # Everyone still connected plays on in the new match
+        for client in list(self.clients):
+            if client.profile is not None:
+                client.player = None
+                self.join(client, dict(zip(('name', 'flag', 'team'), client.profile)))
+
+    def join(self, client, request):
+        if client.player is not None and client.player.state == "running":
+            return
+        world = self.world
+        if client.player is not None:
+            world.remove_player(client.player.id)  # Joining again after dying
+        name = str(request.get('name') or "Player")[:MAX_NAME_LENGTH]
+        flag = request.get('flag')
+        if flag not in world.flags:
+            flag = world.flags[0]
+        team = None
+        if world.teams_mode:
+            team = request.get('team')
+            if team not in teams:
+                # Fill the team with the fewest players
+                players = [other.player.team for other in self.clients if other.player is not None]
+                team = min(teams, key=players.count)
+        client.profile = (name, flag, team)
+        # Spread players out; with many clients the middle of the map would be a feeding ground
+        client.player = world.add_player(name, flag, team, at_center=False)
+        client.input = None
+        client.status = None
+        client.viewer = Viewer()  # Start over from an empty baseline
+        client.send(json_frame(WELCOME, {
+            'player': client.player.id,
+            'mode': world.mode,
+            'width': world.width,
+            'height': world.height,
+            'tick_rate': TICK_RATE,
+            'send_rate': TICK_RATE / self.send_every,
+        }))
+
+    def leave(self, client):
+        self.clients.discard(client)
+        if client.player is not None:
+            self.world.remove_player(client.player.id)
+        client.player = None
+
+    def match_over(self):
+        world = self.world
+        if world.teams_mode:
+            return world.game_timer <= 0
+        if world.battle_royale_mode:
+            # Teammates cannot hurt each other, so the last team standing wins
+            return len(world.enemy_list.groups) + len(world.player_cells.groups) <= 1
+        return False
+
+    def tick(self):
+        start = time.perf_counter_ns()
+        inputs = {}
+        for client in self.clients:
+            if client.player is not None and client.input is not None:
+                inputs[client.player.id] = client.take_input()
+        self.world.step(inputs)
+        if self.world.tick % self.send_every == 0:
+            self.broadcast()
+        if self.match_over():
+            self.broadcast()  # Let everyone see how it ended
+            self.new_match()
+
+        elapsed = time.perf_counter_ns() - start
+        stats = self.stats
+        stats.ticks += 1
+        stats.tick_ns += elapsed
+        stats.max_tick_ns = max(stats.max_tick_ns, elapsed)
+
+    def broadcast(self):
+        stats = self.stats
+        view_frame = ViewFrame(self.world)
+        for client in self.clients:
+            player = client.player
+            if player is None:
+                continue
+            data = b''
+            if client.transport.get_write_buffer_size() > MAX_BUFFERED:
+                stats.skipped += 1  # The next delta still applies to what it acknowledged
+            else:
+                names, delta = client.viewer.update(view_frame, player)
+                if names:
+                    data += json_frame(CELL_INFO, names)
+                data += delta
+            status = (player.state, player.weapon_selection_active)
+            if status != client.status:
+                client.status = status
+                data += json_frame(STATUS, {'state': status[0], 'weapon_selection': status[1]})
+            if data:
+                client.send(data)
+                stats.bytes_out += len(data)
+
+    def report(self, elapsed):
+        stats = self.stats
+        self.stats = ServerStats()
+        if not stats.ticks:
+            return
+        print(f"{len(self.clients)} clients, {stats.ticks / elapsed:.1f} ticks/s, "
+              f"tick {stats.tick_ns / stats.ticks / 1e6:.2f} ms mean / {stats.max_tick_ns / 1e6:.2f} ms max, "
+              f"{stats.late_ticks} dropped, {stats.bytes_out / elapsed / 1024:.0f} KB/s out, "
+              f"{stats.skipped} sends skipped", flush=True)
+
+    async def run(self):
+        # Fixed tick rate; a tick that runs late is caught up, a long stall is dropped
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        next_report = next_tick + STATS_INTERVAL
+        while True:
+            ticks = 0
+            while loop.time() >= next_tick:
+                if ticks == MAX_CATCH_UP_TICKS:
+                    self.stats.late_ticks += round((loop.time() - next_tick) / TICK_DT)
+                    next_tick = loop.time()
+                    break
+                self.tick()
+                next_tick += TICK_DT
+                ticks += 1
+            if loop.time() >= next_report:
+                self.report(STATS_INTERVAL)
+                next_report += STATS_INTERVAL
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+async def serve(host, port, server):
+    loop = asyncio.get_running_loop()
+    listener = await loop.create_server(lambda: ClientConnection(server), host, port)
+    print(f"Serving {server.mode} on {host}:{port}", flush=True)
+    async with listener:
+        await server.run()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='agario.py server', description='Run a dedicated game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--mode', choices=MODES, default='classic')
+    parser.add_argument('--seed', type=int, default=None, help='Match i uses seed + i')
+    parser.add_argument('--send-rate', type=float, default=SEND_RATE, help='State broadcasts per second')
+    parser.add_argument('--ai-budget-ms', type=float, default=AI_BUDGET_MS)
+    parser.add_argument('--world-size', type=int, default=WORLD_WIDTH, help='Width and height of the world')
+    args = parser.parse_args(argv)
+
+    server = GameServer(args.mode, args.seed, args.send_rate, args.ai_budget_ms, args.world_size)
+    try:
+        asyncio.run(serve(args.host, args.port, server))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
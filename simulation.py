@@ -0,0 +1,878 @@
+import math
+import hashlib
+import os
+from itertools import chain
+
+import numpy as np
+
+from bullets import BulletPool, BULLET_TYPES
+from chunks import ChunkManager, WAKE_INTERVAL
+from food import FoodStore
+from ai import BotAI, WANDER, BOT_REPLAN_TICKS
+from registry import EntityRegistry
+from rng import RNGStreams
+from safezone import SafeZone
+from spatial import HierarchicalGrid, PointGrid, overlapping_pairs
+from strips import StripPool
+
+# Headless game simulation: owns the whole world state and never touches
+# pygame, so matches can run without a display.
+
+# Default game world dimensions; World takes any size
+WORLD_WIDTH, WORLD_HEIGHT = 2000, 2000  # Adjusted back to previous size
+
+# Fixed simulation timestep
+TICK_RATE = 60
+TICK_DT = 1 / TICK_RATE
+
+# Flag images live in this folder; the simulation only knows their keys
+FLAGS_FOLDER = 'flags'
+
+# Weapon configurations
+WEAPONS = {
+    'none': {'cost': 0, 'damage': 0, 'rate': 0},
+    'gun': {'cost': 2000, 'damage': 150, 'rate': 0.2},
+    'rpg': {'cost': 3000, 'damage': 400, 'rate': 0.8}
+}
+
+# Grid settings for spatial partitioning
+GRID_SIZE = 100  # Adjust based on performance
+
+# Maximum number of cells allowed for player and bots
+MAX_CELLS = 16
+MAX_BOT_CELLS = 4
+
+FOOD_COUNT = 200  # Adjusted for performance
+FOOD_DENSITY = FOOD_COUNT / (WORLD_WIDTH * WORLD_HEIGHT)  # Food in worlds of other sizes
+FOOD_RESPAWN_TIME = 5  # Time in seconds to respawn food
+
+ENEMY_COUNT = 15  # Adjusted for performance
+BATTLE_ROYALE_ENEMY_COUNT = 49  # 50 players in total
+TEAMS_ENEMY_COUNT = 40  # Adjust number as needed
+cool_names = [
+    "Shadow", "Ghost", "Blaze", "Storm", "Viper", "Phantom", "Ranger",
+    "Hunter", "Predator", "Maverick", "Titan", "Zephyr", "Nova", "Falcon",
+    "Spectre", "Vortex", "Blizzard", "Phoenix", "Nebula", "Inferno",
+    "Cyclone", "Kraken", "Bullet", "Reaper", "Serpent", "Golem"
+]
+
+# Teams mode settings
+teams = ['red', 'blue', 'green', 'yellow']
+GAME_DURATION = 300  # 5 minutes in seconds
+
+# Game modes
+MODES = ['classic', 'battle_royale', 'teams']
+
+# Small integer codes for teams, used by array-based systems; 0 is no team
+TEAM_CODES = {team: code for code, team in enumerate([None] + teams)}
+
+def list_flags(folder=FLAGS_FOLDER):
+    # Flag keys as used by the client's flag_images, in a stable order
+    return sorted(filename[:-4].lower() for filename in os.listdir(folder) if filename.endswith('.png'))
+
+# Cell class
+class Cell:
+    def __init__(self, x, y, radius, mass, speed, name, flag, team=None):
+        self.pos = [x, y]
+        self.prev_pos = [x, y]  # Position at the start of the tick, for interpolation
+        self.radius = radius
+        self.mass = mass
+        self.speed = speed
+        self.direction = [0, 0]
+        self.split_cooldown = 0
+        self.flag = flag  # Key into the client's flag images
+        self.name_surface = None  # Render cache, filled in by the client
+        self.name = name
+        self.weapon = 'none'
+        self.weapon_cooldown = 0
+        self.weapon_level = 0  # 0: none, 1: gun, 2: dual gun
+        self.movement_locked = False  # For movement lock
+        self.locked_direction = [0, 0]
+        self.team = team  # Team assignment
+        self.id = None  # Assigned by the world when the cell is added
+        self.lineage = None  # Id of the first cell of the bot or player; splits share it
+        self.alive = True  # Cleared when the cell dies; it leaves the world at the end of the tick
+
+    def update(self, dt, width, height):
+        # Apply movement
+        if self.movement_locked:
+            # Continue in locked direction
+            dx, dy = self.locked_direction
+            speed = self.speed * (20 / self.radius) if self.radius else 0  # Slower when larger
+            self.pos[0] += dx * speed * dt * 60  # Multiply by 60 to normalize speed
+            self.pos[1] += dy * speed * dt * 60
+        else:
+            # Apply split movement
+            self.pos[0] += self.direction[0] * dt
+            self.pos[1] += self.direction[1] * dt
+
+            # Friction to slow down split cells
+            self.direction[0] *= 0.90
+            self.direction[1] *= 0.90
+
+        # Decrease split cooldown
+        if self.split_cooldown > 0:
+            self.split_cooldown -= dt
+        else:
+            self.split_cooldown = 0
+
+        # Decrease weapon cooldown
+        if self.weapon_cooldown > 0:
+            self.weapon_cooldown -= dt
+        else:
+            self.weapon_cooldown = 0
+
+        # Keep cells within world bounds
+        self.pos[0] = max(self.radius, min(width - self.radius, self.pos[0]))
+        self.pos[1] = max(self.radius, min(height - self.radius, self.pos[1]))
+
+    def buy_weapon(self, weapon):
+        self.weapon = weapon
+        self.weapon_level = 1
+        # Deduct cost
+        self.mass -= WEAPONS[weapon]['cost']
+        if self.mass < 0:
+            self.mass = 0
+        self.radius = math.sqrt(self.mass) if self.mass > 0 else 0
+
+    def shoot(self, target_x, target_y, bullets):
+        if self.weapon == 'none' or self.weapon_cooldown > 0:
+            return
+        weapon_info = WEAPONS[self.weapon]
+        # Create bullet
+        dx, dy = target_x - self.pos[0], target_y - self.pos[1]
+        dist = math.hypot(dx, dy)
+        if dist != 0:
+            dx /= dist
+            dy /= dist
+        else:
+            dx, dy = 0, 0
+        speed = 500  # Bullet speed
+        bullets.spawn(
+            self.pos[0] + dx * self.radius,
+            self.pos[1] + dy * self.radius,
+            dx * speed,
+            dy * speed,
+            weapon_info['damage'],
+            BULLET_TYPES.index(self.weapon),
+            TEAM_CODES[self.team],
+            self.id
+        )
+        # Set weapon cooldown
+        self.weapon_cooldown = weapon_info['rate']
+        # Reduce mass as cost
+        self.mass = max(0, self.mass - 10)
+        self.radius = math.sqrt(self.mass) if self.mass > 0 else 0
+
+# Player cell subclass
+class PlayerCell(Cell):
+    def __init__(self, x, y, radius, mass, speed, name, flag, team=None, player_id=0):
+        super().__init__(x, y, radius, mass, speed, name, flag, team)
+        self.player_id = player_id  # Player controlling this cell
+
+    def move_towards(self, target_x, target_y):
+        if self.movement_locked:
+            # Direction is locked; movement handled in update()
+            return
+        dx, dy = target_x - self.pos[0], target_y - self.pos[1]
+        dist = math.hypot(dx, dy)
+        if dist > 5:  # Movement threshold to prevent shaking
+            dx, dy = dx / dist, dy / dist  # Normalize
+            speed = self.speed * (20 / self.radius) if self.radius else 0  # Slower when larger
+            self.pos[0] += dx * speed
+            self.pos[1] += dy * speed
+            self.direction = [dx, dy]
+
+# Enemy cell subclass
+class EnemyCell(Cell):
+    def __init__(self, x, y, radius, mass, speed, name, flag, team=None, angle=0.0):
+        super().__init__(x, y, radius, mass, speed, name, flag, team)
+        self.direction = [math.cos(angle), math.sin(angle)]
+        # Plan cached by the bot AI between re-plans
+        self.ai_mode = WANDER
+        self.ai_target = None  # Cell being hunted or fled from
+        self.ai_goal = None  # Food position being foraged
+        self.ai_planned_tick = -BOT_REPLAN_TICKS  # Tick of the last plan; due at once
+
+    def split(self, world):
+        # Split the cell
+        if (self.mass >= 400 and self.split_cooldown <= 0 and
+            world.enemy_list.group_size(self.team) < MAX_BOT_CELLS):
+            mass1 = self.mass / 2
+            mass2 = self.mass / 2
+            radius1 = math.sqrt(mass1)
+            radius2 = math.sqrt(mass2)
+            angle = world.cell_rng.uniform(0, 2 * math.pi)
+            dx, dy = math.cos(angle), math.sin(angle)
+            dist = math.hypot(dx, dy)
+            if dist != 0:
+                dx /= dist
+                dy /= dist
+            else:
+                dx, dy = 0, 0
+            speed = 300  # Speed of the ejected cell
+            new_cell = EnemyCell(
+                self.pos[0] + dx * self.radius,
+                self.pos[1] + dy * self.radius,
+                radius2,
+                mass2,
+                self.speed,
+                self.name,
+                self.flag,
+                self.team
+            )
+            new_cell.direction = [dx * speed, dy * speed]
+            new_cell.split_cooldown = 2
+            new_cell.lineage = self.lineage
+            # Adjust original cell
+            self.mass = mass1
+            if self.mass < 0:
+                self.mass = 0
+            self.radius = math.sqrt(self.mass) if self.mass > 0 else 0
+            self.direction[0] -= new_cell.direction[0] * 0.1
+            self.direction[1] -= new_cell.direction[1] * 0.1
+            self.split_cooldown = 2  # 2 seconds cooldown
+            world.add_enemy(new_cell)
+
+# A human (or network) controlled player and its per-player game state
+class Player:
+    def __init__(self, id, name, flag, team=None):
+        self.id = id
+        self.name = name
+        self.flag = flag
+        self.team = team
+        self.state = "running"  # Can be "running", "game_over", "won", "left"
+        self.target = None  # Last movement target in world coordinates
+        self.weapon_selection_active = False
+
+# Inputs for one player, consumed by the next simulation tick
+class PlayerInput:
+    def __init__(self, target=None, split=False, shoot=False, toggle_lock=False, weapon=None):
+        self.target = target  # Mouse position in world coordinates
+        self.split = split
+        self.shoot = shoot
+        self.toggle_lock = toggle_lock
+        self.weapon = weapon  # Weapon picked on the weapon selection screen
+
+# The whole game world; advance it with step(), one fixed tick at a time.
+# Everything random comes from per-subsystem streams derived from seed, so
+# the same seed and the same inputs always produce the same world.
+class World:
+    def __init__(self, mode='classic', flags=None, food_count=None, enemy_count=None, ai_budget_ms=None,
+                 seed=None, width=WORLD_WIDTH, height=WORLD_HEIGHT, workers=None, grid_size=GRID_SIZE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown game mode: {mode}")
+        self.mode = mode
+        self.battle_royale_mode = mode == 'battle_royale'
+        self.teams_mode = mode == 'teams'
+        self.flags = flags if flags is not None else list_flags()
+        self.width = width
+        self.height = height
+        self.time = 0.0
+        self.tick = 0
+        self.streams = RNGStreams(seed)
+        self.seed = self.streams.seed
+        self.spawn_rng = self.streams.python('spawn')  # Enemy and player placement
+        self.cell_rng = self.streams.python('cells')  # Bot headings and splits
+
+        self.players = {}  # Players in the match; leaving drops them, see remove_player()
+        self.next_player_id = 0
+        self.next_cell_id = 0
+        self.player_cells = EntityRegistry('player_id')  # Grouped by owning player
+        self.enemy_list = EntityRegistry('team')  # Grouped by team
+        self.available_names = cool_names.copy()
+        # Food in the whole world; it is only generated near cells, see chunks.py
+        self.food_count = food_count if food_count is not None else round(FOOD_DENSITY * width * height)
+        self.food = FoodStore(FOOD_RESPAWN_TIME, self.streams.numpy('food'))
+        self.chunks = ChunkManager(width, height, self.food_count, self.food, self.streams.sequences['food'])
+        self.bullets = BulletPool()
+        self.bot_ai = BotAI(self.streams.numpy('ai'), width, height, ai_budget_ms)
+        # Bots spawned at the start, and the level respawns keep the world at
+        if enemy_count is None:
+            self.enemy_count = {'classic': ENEMY_COUNT, 'battle_royale': BATTLE_ROYALE_ENEMY_COUNT,
+                                'teams': TEAMS_ENEMY_COUNT}[mode]
+            self.respawn_count = ENEMY_COUNT
+        else:
+            self.enemy_count = self.respawn_count = enemy_count
+
+        # Spatial partitioning; kept up to date as things move, spawn and die.
+        # The bucket size only changes speed, never the outcome
+        self.grid_size = grid_size
+        self.cell_hash = HierarchicalGrid(grid_size)
+        self.food_hash = PointGrid(grid_size)
+        self.max_cell_radius = 0  # Largest cell radius, widens cell queries
+        # Collision detection in worker processes, see strips.py; call close() when done
+        self.strips = StripPool(workers) if workers else None
+
+        # Battle Royale specific state; the zone itself follows safe_zone's
+        # schedule and these mirror it for the current tick
+        self.safe_zone = None
+        self.safe_zone_start = 0.0
+        self.safe_zone_radius = None
+        self.safe_zone_damage = 0
+        self.safe_zone_stage = 0
+        self.safe_zone_center = [width // 2, height // 2]
+
+        # Cells destroyed, by the lineage of the cell that ate or shot them;
+        # names repeat between bots, so they are kept apart
+        self.kills = {}
+        self.killer_names = {}  # Lineage -> name, for every key of kills
+
+        # Teams mode specific state
+        self.team_scores = {team: 0 for team in teams}
+        self.game_timer = GAME_DURATION
+
+    def add_player(self, name, flag, team=None, at_center=None):
+        player = Player(self.next_player_id, name, flag, team)
+        self.next_player_id += 1
+        self.players[player.id] = player
+        # Initialize player cell; classic games start in the middle unless told otherwise
+        if at_center is None:
+            at_center = self.mode == 'classic'
+        if at_center:
+            x, y = self.width // 2, self.height // 2
+        else:
+            x, y = self.spawn_rng.randint(0, self.width), self.spawn_rng.randint(0, self.height)
+        self.add_player_cell(PlayerCell(x, y, 40, 1600, 5, name, flag, team=team, player_id=player.id))
+        # Players joining mid-match find food at once instead of at the next wake pass
+        self.index_food(self.chunks.wake(self.chunks.keys_near(x, y, 40), self.time))
+        return player
+
+    def remove_player(self, player_id):
+        # Take a player out of the world, e.g. when a client leaves or joins
+        # again. Its cells go at the end of the next tick like any other dead
+        # cell, and the player with them
+        player = self.players.get(player_id)
+        if player is None:
+            return
+        cells = self.cells_of(player_id)
+        for cell in cells:
+            self.player_cells.kill(cell)
+        if cells:
+            player.state = "left"
+        else:
+            del self.players[player_id]
+
+    def start(self):
+        # Populate the world for the selected mode; food goes where the cells are
+        self.spawn_enemies(count=self.enemy_count)
+        self.spawn_food()
+        if self.battle_royale_mode:
+            self.initialize_battle_royale()
+
+    def close(self):
+        if self.strips is not None:
+            self.strips.close()
+            self.strips = None
+
+    def cell_count(self):
+        return len(self.player_cells) + len(self.enemy_list)
+
+    def cell_at(self, index):
+        # Cell by its position in all_cells()
+        player_count = len(self.player_cells)
+        if index < player_count:
+            return self.player_cells.items[index]
+        return self.enemy_list.items[index - player_count]
+
+    def cell_positions(self):
+        # x and y arrays in all_cells() order
+        count = self.cell_count()
+        return (np.fromiter((cell.pos[0] for cell in self.all_cells()), dtype=float, count=count),
+                np.fromiter((cell.pos[1] for cell in self.all_cells()), dtype=float, count=count))
+
+    def find_cell(self, cell_id):
+        # Cell by id, or None if it is no longer in the world
+        for registry in (self.player_cells, self.enemy_list):
+            if cell_id in registry.positions:
+                return registry.get(cell_id)
+        return None
+
+    def cells_of(self, player_id):
+        return self.player_cells.group(player_id)
+
+    def all_cells(self):
+        # Player cells then enemies, straight from the registries without
+        # building a combined list
+        return chain(self.player_cells.items, self.enemy_list.items)
+
+    def step(self, inputs=None):
+        # Advance the world by one fixed tick; inputs maps player id to PlayerInput
+        dt = TICK_DT
+        self.tick += 1
+        self.time = self.tick * TICK_DT
+
+        # Remember where everything was so rendering can interpolate
+        for cell in self.all_cells():
+            cell.prev_pos[0], cell.prev_pos[1] = cell.pos
+
+        if inputs:
+            for player_id, player_input in inputs.items():
+                self.apply_input(self.players[player_id], player_input)
+
+        # Player movement towards their targets
+        for cell in self.player_cells:
+            target = self.players[cell.player_id].target
+            if target:
+                cell.move_towards(target[0], target[1])
+            cell.update(dt, self.width, self.height)
+
+        self.update_food(dt)
+
+        # Move every bot in one batch
+        self.bot_ai.step(self, dt)
+
+        self.update_cell_hash()
+
+        # Handle bullets
+        self.handle_bullets(dt)
+
+        # Check for collisions
+        self.check_collisions()
+
+        if self.battle_royale_mode:
+            self.update_safe_zone(dt)
+            self.apply_safe_zone_damage(dt)
+
+        # Everything that died this tick leaves the world in one go
+        self.remove_dead_cells()
+
+        if self.battle_royale_mode:
+            if len(self.enemy_list) == 0 and len(self.player_cells.groups) == 1:
+                for player_id in self.player_cells.groups:
+                    self.players[player_id].state = "won"
+        elif self.teams_mode:
+            self.game_timer -= dt
+            if self.game_timer <= 0:
+                for player in self.players.values():
+                    player.state = "won"
+
+        self.respawn_enemies(dt)
+
+        # Check if players can choose a weapon
+        for player in self.players.values():
+            cells = self.cells_of(player.id)
+            if cells and not player.weapon_selection_active:
+                total_mass = sum(cell.mass for cell in cells)
+                if total_mass >= 5000 and cells[0].weapon == 'none':
+                    player.weapon_selection_active = True
+
+    def state_hash(self):
+        # Digest of everything that decides how the world evolves from here;
+        # two worlds with equal hashes at the same tick stay in lockstep
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.array([self.tick, self.next_cell_id, self.next_player_id], dtype=np.int64).tobytes())
+        cells = list(self.all_cells())
+        digest.update(np.array([
+            (cell.id, cell.pos[0], cell.pos[1], cell.radius, cell.mass, cell.direction[0], cell.direction[1],
+             cell.split_cooldown, cell.weapon_cooldown, cell.weapon_level, cell.movement_locked,
+             cell.locked_direction[0], cell.locked_direction[1], TEAM_CODES[cell.team], cell.alive)
+            for cell in cells
+        ], dtype=float).tobytes())
+        for cell in cells:
+            digest.update(f"{cell.name}|{cell.weapon}|{cell.flag}|".encode())
+            if isinstance(cell, EnemyCell):
+                target = cell.ai_target.id if cell.ai_target is not None else -1
+                digest.update(repr((cell.ai_mode, target, cell.ai_goal, cell.ai_planned_tick)).encode())
+        food = self.food
+        for array in (food.x, food.y, food.respawn_timer, food.alive):
+            digest.update(array.tobytes())
+        digest.update(repr([(chunk.key, chunk.awake, chunk.slept_at) for chunk in self.chunks.chunks.values()]).encode())
+        bullets = self.bullets
+        active = bullets.active()
+        for array in (bullets.x, bullets.y, bullets.vx, bullets.vy, bullets.damage, bullets.type,
+                      bullets.team, bullets.owner):
+            digest.update(array[active].tobytes())
+        digest.update(repr((
+            self.safe_zone_center, self.safe_zone_radius, self.safe_zone_damage, self.team_scores,
+            self.game_timer, self.available_names,
+            [(player.id, player.state, player.target, player.weapon_selection_active)
+             for player in self.players.values()],
+            self.spawn_rng.getstate(), self.cell_rng.getstate(),
+            food.rng.bit_generator.state, self.bot_ai.rng.bit_generator.state
+        )).encode())
+        return digest.hexdigest()
+
+    def apply_input(self, player, player_input):
+        if player_input.target is not None:
+            player.target = player_input.target
+        if player_input.weapon and player.weapon_selection_active:
+            self.buy_weapon(player, player_input.weapon)
+            player.weapon_selection_active = False
+        if player.target is None:
+            return
+        target_x, target_y = player.target
+        if player_input.split:
+            self.split_player_cells(player, target_x, target_y)
+        if player_input.toggle_lock:
+            self.toggle_movement_lock(player)
+        if player_input.shoot:
+            for cell in self.cells_of(player.id):
+                cell.shoot(target_x, target_y, self.bullets)
+
+    def split_player_cells(self, player, target_x, target_y):
+        new_cells = []
+        for cell in self.cells_of(player.id):
+            if (cell.mass >= 400 and cell.split_cooldown <= 0 and
+                self.player_cells.group_size(player.id) + len(new_cells) < MAX_CELLS):
+                # Split the cell
+                mass1 = cell.mass / 2
+                mass2 = cell.mass / 2
+                radius1 = math.sqrt(mass1)
+                radius2 = math.sqrt(mass2)
+                # Eject towards the target
+                dx, dy = target_x - cell.pos[0], target_y - cell.pos[1]
+                dist = math.hypot(dx, dy)
+                if dist != 0:
+                    dx /= dist
+                    dy /= dist
+                else:
+                    dx, dy = 0, 0
+                speed = 300  # Speed of the ejected cell
+                new_cell = PlayerCell(
+                    cell.pos[0] + dx * cell.radius,
+                    cell.pos[1] + dy * cell.radius,
+                    radius2,
+                    mass2,
+                    cell.speed,
+                    cell.name,
+                    cell.flag,
+                    team=cell.team,
+                    player_id=player.id
+                )
+                new_cell.direction = [dx * speed, dy * speed]
+                new_cell.split_cooldown = 2
+                new_cell.lineage = cell.lineage
+                new_cell.weapon = cell.weapon
+                new_cell.weapon_level = cell.weapon_level
+                new_cell.movement_locked = cell.movement_locked
+                new_cell.locked_direction = cell.locked_direction[:]
+                # Adjust original cell
+                cell.mass = mass1
+                cell.radius = radius1
+                cell.direction[0] += dx * speed * 0.1
+                cell.direction[1] += dy * speed * 0.1
+                cell.split_cooldown = 2  # 2 seconds cooldown
+                new_cells.append(new_cell)
+        for new_cell in new_cells:
+            self.add_player_cell(new_cell)
+
+    def toggle_movement_lock(self, player):
+        # Toggle movement lock for all of the player's cells
+        cells = self.cells_of(player.id)
+        movement_locked = not all(cell.movement_locked for cell in cells)
+        for cell in cells:
+            cell.movement_locked = movement_locked
+            if cell.movement_locked:
+                dx, dy = cell.direction
+                cell.locked_direction = dx, dy
+
+    def buy_weapon(self, player, weapon):
+        for cell in self.cells_of(player.id):
+            cell.buy_weapon(weapon)
+
+    def add_player_cell(self, cell):
+        cell.id = self.next_cell_id
+        self.next_cell_id += 1
+        if cell.lineage is None:
+            cell.lineage = cell.id
+        self.player_cells.add(cell)
+        self.cell_hash.insert(cell, cell.pos[0], cell.pos[1])
+
+    def add_enemy(self, cell):
+        cell.id = self.next_cell_id
+        self.next_cell_id += 1
+        if cell.lineage is None:
+            cell.lineage = cell.id
+        self.enemy_list.add(cell)
+        self.cell_hash.insert(cell, cell.pos[0], cell.pos[1])
+
+    def kill_cell(self, cell):
+        # Mark a cell dead; it stays in place until remove_dead_cells()
+        if isinstance(cell, PlayerCell):
+            self.player_cells.kill(cell)
+        else:
+            self.enemy_list.kill(cell)
+
+    def remove_dead_cells(self):
+        for cell in self.enemy_list.flush():
+            self.cell_hash.remove(cell)
+        # flush() removes every dead cell before returning them, so look at
+        # each player once, after all of its cells are gone
+        emptied = {}
+        for cell in self.player_cells.flush():
+            self.cell_hash.remove(cell)
+            emptied[cell.player_id] = None
+        for player_id in emptied:
+            if self.player_cells.group_size(player_id):
+                continue
+            if self.players[player_id].state == "left":
+                del self.players[player_id]
+            else:
+                self.players[player_id].state = "game_over"
+
+    def update_cell_hash(self):
+        # Re-bucket cells that crossed a grid boundary since the last tick
+        max_cell_radius = 0
+        for cell in self.all_cells():
+            self.cell_hash.move(cell, cell.pos[0], cell.pos[1])
+            if cell.radius > max_cell_radius:
+                max_cell_radius = cell.radius
+        self.max_cell_radius = max_cell_radius
+
+    def nearby_cells(self, x, y, radius):
+        # Cells that may overlap a circle; the hash stores centers, so widen
+        # the query by the largest cell radius
+        return self.cell_hash.query(x, y, radius + self.max_cell_radius)
+
+    def initialize_battle_royale(self):
+        # Plan every phase of the zone now, from the zone's own stream
+        self.safe_zone = SafeZone(self.streams.sequences['zone'], self.width, self.height)
+        self.safe_zone_start = self.time
+        self.update_safe_zone(0)
+
+    def update_safe_zone(self, dt):
+        cx, cy, radius, damage, phase = self.safe_zone.at(self.time - self.safe_zone_start)
+        self.safe_zone_center[0], self.safe_zone_center[1] = cx, cy
+        self.safe_zone_radius = radius
+        self.safe_zone_damage = damage
+        self.safe_zone_stage = phase + 1
+
+    def apply_safe_zone_damage(self, dt):
+        # One vectorized distance test for every cell; only cells in the storm
+        # are touched from Python
+        if not self.cell_count():
+            return
+        x, y = self.cell_positions()
+        damage = self.safe_zone_damage * dt  # Damage increases with each stage
+        for index in np.flatnonzero(self.safe_zone.outside(self.time - self.safe_zone_start, x, y)).tolist():
+            cell = self.cell_at(index)
+            if not cell.alive:
+                continue
+            cell.mass -= damage
+            if cell.mass <= 0:
+                cell.mass = 0
+                self.kill_cell(cell)
+            else:
+                cell.radius = math.sqrt(cell.mass)
+
+    def spawn_food(self):
+        # Wake the chunks around every cell, generating their food the first
+        # time, and let the chunks nobody is near go dormant
+        x, y = self.cell_positions()
+        radius = np.fromiter((cell.radius for cell in self.all_cells()), dtype=float, count=len(x))
+        self.index_food(self.chunks.refresh(x, y, radius, self.time))
+
+    def update_food(self, dt):
+        # Update respawn timers in awake chunks; ready food respawns at a new
+        # random position in its chunk
+        if self.tick % WAKE_INTERVAL == 0:
+            self.spawn_food()
+        self.index_food(self.food.update(dt, self.chunks.awake))
+
+    def food_in_view(self, left, top, width, height):
+        # Slots of the live food in a rectangle, from the food grid, so the
+        # cost follows what is in view and not how much food the world has
+        slots = np.fromiter(chain.from_iterable(self.food_hash.buckets_in(left, top, left + width, top + height)),
+                            dtype=np.int64)
+        food = self.food
+        x = food.x[slots]
+        y = food.y[slots]
+        return slots[food.alive[slots] & (x >= left) & (x <= left + width) & (y >= top) & (y <= top + height)]
+
+    def index_food(self, indices):
+        for index, x, y in zip(indices.tolist(), self.food.x[indices].tolist(), self.food.y[indices].tolist()):
+            self.food_hash.insert(index, x, y)
+
+    def spawn_enemy(self, team=None):
+        if not self.available_names:
+            self.available_names = cool_names.copy()
+        rng = self.spawn_rng
+        name = rng.choice(self.available_names)
+        self.available_names.remove(name)
+        x = rng.randint(0, self.width)
+        y = rng.randint(0, self.height)
+        radius = rng.randint(15, 40)
+        mass = radius ** 2
+        # Randomly assign a country flag to the enemy
+        flag = rng.choice(self.flags)
+        if not team:
+            team = rng.choice(teams)
+        enemy = EnemyCell(x, y, radius, mass, 5, name, flag, team, angle=self.cell_rng.uniform(0, 2 * math.pi))
+        self.add_enemy(enemy)
+
+    def spawn_enemies(self, count=ENEMY_COUNT):
+        if self.teams_mode:
+            team_counts = {team: 0 for team in teams}
+            # Distribute enemies equally among teams
+            for _ in range(count):
+                team = min(team_counts, key=team_counts.get)
+                self.spawn_enemy(team=team)
+                team_counts[team] += 1
+        else:
+            for _ in range(count):
+                self.spawn_enemy()
+
+    def respawn_enemies(self, dt):
+        if self.battle_royale_mode:
+            return  # Do not respawn enemies in battle royale mode
+        if self.teams_mode:
+            # Maintain enemy counts per team
+            desired_count = self.respawn_count // len(teams)
+            for team in teams:
+                current_count = self.enemy_list.group_size(team)
+                if current_count < desired_count:
+                    self.spawn_enemy(team=team)
+        else:
+            # In classic mode, maintain total enemy count
+            while len(self.enemy_list) < self.respawn_count:
+                self.spawn_enemy()
+
+    def check_collisions(self):
+        # Check collision with food; each pellet goes to the first cell that reaches it
+        if self.strips is not None:
+            cells = self.check_food_in_strips()
+        else:
+            for cell in self.all_cells():
+                if not cell.alive:
+                    continue
+                candidates = np.fromiter(self.food_hash.query(cell.pos[0], cell.pos[1], cell.radius), dtype=np.intp)
+                if not len(candidates):
+                    continue
+                eaten = self.food.eat(candidates, cell.pos[0], cell.pos[1], cell.radius)
+                if len(eaten):
+                    self.feed(cell, eaten)
+
+        # Check collisions among cells; eaten cells are only marked dead here.
+        # Overlapping pairs of rivals where one is big enough to eat the other
+        # are found in one batch, then resolved in order.
+        count = self.cell_count()
+        if count > 1:
+            if self.strips is not None:
+                first, second = self.strips.edible_pairs(*cells)
+            else:
+                x, y = self.cell_positions()
+                radius = np.fromiter((cell.radius for cell in self.all_cells()), dtype=float, count=count)
+                team = np.fromiter((TEAM_CODES[cell.team] for cell in self.all_cells()), dtype=np.int8, count=count)
+                first, second = overlapping_pairs(x, y, radius)
+                edible = ((team[first] != team[second]) &
+                          ((radius[first] > radius[second] * 1.1) | (radius[second] > radius[first] * 1.1)))
+                first, second = first[edible], second[edible]
+            for i, j in zip(first.tolist(), second.tolist()):
+                cell = self.cell_at(i)
+                other = self.cell_at(j)
+                if not cell.alive or not other.alive:
+                    continue
+                dist = math.hypot(cell.pos[0] - other.pos[0], cell.pos[1] - other.pos[1])
+                if dist < cell.radius + other.radius:
+                    # Handle collision
+                    if cell.radius > other.radius * 1.1:
+                        self.eat(cell, other)
+                    elif other.radius > cell.radius * 1.1:
+                        self.eat(other, cell)
+
+        # Check collision between each player's own cells for merging
+        for cell in self.player_cells:
+            if not cell.alive:
+                continue
+            for other in self.nearby_cells(cell.pos[0], cell.pos[1], cell.radius):
+                if (other is cell or not other.alive or not isinstance(other, PlayerCell) or
+                    other.player_id != cell.player_id):
+                    continue
+                dist = math.hypot(cell.pos[0] - other.pos[0], cell.pos[1] - other.pos[1])
+                if dist < cell.radius + other.radius:
+                    if cell.split_cooldown <= 0 and other.split_cooldown <= 0:
+                        total_mass = cell.mass + other.mass
+                        new_radius = math.sqrt(total_mass)
+                        cell.mass = total_mass
+                        cell.radius = new_radius
+                        self.max_cell_radius = max(self.max_cell_radius, new_radius)
+                        self.player_cells.kill(other)
+                        break
+
+    def check_food_in_strips(self):
+        # The workers find which cell gets each pellet; feeding the cells in
+        # world order gives the same result as the loop in check_collisions.
+        # Returns the cell arrays, with the radii after eating, for the pairs
+        count = self.cell_count()
+        if not count:
+            return None
+        x, y = self.cell_positions()
+        radius = np.fromiter((cell.radius for cell in self.all_cells()), dtype=float, count=count)
+        team = np.fromiter((TEAM_CODES[cell.team] for cell in self.all_cells()), dtype=np.int8, count=count)
+        alive = np.fromiter((cell.alive for cell in self.all_cells()), dtype=bool, count=count)
+        pellets, eaters = self.strips.eaten_food(x, y, radius, team, alive, self.food, self.width)
+        order = np.lexsort((pellets, eaters))
+        pellets = pellets[order]
+        eaters = eaters[order]
+        starts = np.flatnonzero(np.diff(eaters, prepend=-1))
+        for start, end in zip(starts.tolist(), starts[1:].tolist() + [len(eaters)]):
+            eaten = pellets[start:end]
+            index = int(eaters[start])
+            cell = self.cell_at(index)
+            self.food.take(eaten)
+            self.feed(cell, eaten)
+            radius[index] = cell.radius
+        return x, y, radius, team, alive
+
+    def feed(self, cell, eaten):
+        # cell eats the given food slots
+        food = self.food
+        for index, x, y in zip(eaten.tolist(), food.x[eaten].tolist(), food.y[eaten].tolist()):
+            self.food_hash.remove(index, x, y)
+        gained = float(food.mass[eaten].sum())
+        cell.mass += gained
+        cell.radius = math.sqrt(cell.mass)
+        if cell.radius > self.max_cell_radius:
+            self.max_cell_radius = cell.radius
+        if self.teams_mode and cell.team:
+            self.team_scores[cell.team] += gained
+
+    def record_kill(self, cell):
+        self.kills[cell.lineage] = self.kills.get(cell.lineage, 0) + 1
+        self.killer_names[cell.lineage] = cell.name
+
+    def eat(self, cell, other):
+        # cell swallows other
+        cell.mass += other.mass
+        cell.radius = math.sqrt(cell.mass)
+        self.max_cell_radius = max(self.max_cell_radius, cell.radius)
+        self.kill_cell(other)
+        self.record_kill(cell)
+        if isinstance(other, PlayerCell):
+            if not self.teams_mode:
+                self.players[other.player_id].state = "game_over"
+        elif self.teams_mode and cell.team:
+            self.team_scores[cell.team] += other.mass
+
+    def handle_bullets(self, dt):
+        # Move every bullet, then find all bullet-vs-cell hits in one batched pass
+        self.bullets.integrate(dt)
+        count = self.cell_count()
+        if len(self.bullets) and count:
+            x, y = self.cell_positions()
+            hit_bullets, hit_cells = self.bullets.find_hits(
+                x, y,
+                np.fromiter((cell.radius for cell in self.all_cells()), dtype=float, count=count),
+                np.fromiter((TEAM_CODES[cell.team] for cell in self.all_cells()), dtype=np.int8, count=count),
+                self.grid_size
+            )
+            for damage, owner, cell_index in zip(self.bullets.damage[hit_bullets].tolist(),
+                                                 self.bullets.owner[hit_bullets].tolist(), hit_cells.tolist()):
+                target = self.cell_at(cell_index)
+                if not target.alive:
+                    continue  # Already destroyed by an earlier hit this tick
+                # Deal damage
+                target.mass -= damage
+                if target.mass <= 0:
+                    target.mass = 0
+                    self.kill_cell(target)
+                    shooter = self.find_cell(owner)
+                    if shooter is not None:
+                        self.record_kill(shooter)
+                else:
+                    target.radius = math.sqrt(target.mass)
+            self.bullets.kill(hit_bullets)
+
+        # Remove bullets that left the world
+        self.bullets.cull(self.width, self.height)
@@ -0,0 +1,311 @@
+import gc
+import json
+import math
+import struct
+from itertools import accumulate, chain, repeat
+from operator import attrgetter
+
+import numpy as np
+
+from bullets import BULLET_ARRAYS
+from chunks import Chunk
+from food import FOOD_ARRAYS
+from safezone import SafeZone
+from spatial import PointHash
+from simulation import World, Player, Cell, PlayerCell, EnemyCell, WEAPONS, TEAM_CODES
+
+# Save and restore the whole world between ticks, for checkpoints and for
+# restarting a server mid-match. The format is packed, not pickled:
+#
+#   header   magic, version and the length of the JSON block
+#   JSON     scalars and short lists: mode, seed, tick, players, scores,
+#            timers, safe zone, RNG states, the string table, and the name,
+#            dtype and shape of every array that follows
+#   arrays   raw NumPy buffers, back to back: one structured row per cell,
+#            food and bullet slots, the generated chunks, registry group
+#            order and the contents of every spatial grid bucket
+#
+# Names and flags go through the string table, so flags are stored by key
+# and the client looks the images up again. Bucket contents are stored in
+# order, so a restored world carries on exactly like the original: equal
+# state_hash() now and on every later tick.
+#
+# The food grid holds every pellet on every level, so rebuilding it is most
+# of a restore. It is a PointGrid, with no object -> bucket index to rebuild
+# next to the buckets, and the garbage collector is kept out of the way.
+#
+#   data = dump_snapshot(world)
+#   world = restore_snapshot(data)
+
+SNAPSHOT_MAGIC = b'AGSS'
+SNAPSHOT_VERSION = 4
+
+HEADER = struct.Struct('<4sBI')  # magic, version, JSON length
+
+WEAPON_NAMES = list(WEAPONS)
+TEAM_NAMES = list(TEAM_CODES)  # Indexed by team code
+
+# One row per cell; player is -1 for bots and the ai fields are unused for players
+CELL_DTYPE = np.dtype([
+    ('id', '<i8'), ('lineage', '<i8'), ('player', '<i4'),
+    ('x', '<f8'), ('y', '<f8'), ('prev_x', '<f8'), ('prev_y', '<f8'),
+    ('radius', '<f8'), ('mass', '<f8'), ('speed', '<f8'), ('dx', '<f8'), ('dy', '<f8'),
+    ('split_cooldown', '<f8'), ('weapon_cooldown', '<f8'), ('weapon_level', '<i4'),
+    ('movement_locked', '?'), ('locked_dx', '<f8'), ('locked_dy', '<f8'),
+    ('team', 'i1'), ('name', '<i4'), ('flag', '<i4'), ('weapon', 'i1'), ('alive', '?'),
+    ('ai_mode', 'i1'), ('ai_target', '<i8'), ('ai_goal_x', '<f8'), ('ai_goal_y', '<f8'),
+    ('has_goal', '?'), ('ai_planned_tick', '<i8'),
+])
+SNAPSHOT_DTYPES = {'cells': CELL_DTYPE}  # Arrays whose dtype a dtype string cannot describe
+
+def dump_snapshot(world):
+    strings = {}
+    def string(value):
+        return strings.setdefault(value, len(strings))
+
+    rows = []
+    for cell in world.all_cells():
+        if isinstance(cell, EnemyCell):
+            goal = cell.ai_goal
+            ai = (-1, cell.ai_mode, cell.ai_target.id if cell.ai_target is not None else -1,
+                  goal[0] if goal else 0.0, goal[1] if goal else 0.0, goal is not None, cell.ai_planned_tick)
+        else:
+            ai = (cell.player_id, 0, -1, 0.0, 0.0, False, 0)
+        rows.append((
+            cell.id, cell.lineage, ai[0], cell.pos[0], cell.pos[1], cell.prev_pos[0], cell.prev_pos[1],
+            cell.radius, cell.mass, cell.speed, cell.direction[0], cell.direction[1],
+            cell.split_cooldown, cell.weapon_cooldown, cell.weapon_level,
+            cell.movement_locked, cell.locked_direction[0], cell.locked_direction[1],
+            TEAM_CODES[cell.team], string(cell.name), string(cell.flag), WEAPON_NAMES.index(cell.weapon),
+            cell.alive) + ai[1:])
+
+    arrays = {'cells': np.array(rows, dtype=CELL_DTYPE)}
+    arrays['player_groups'] = group_order(world.player_cells)
+    arrays['enemy_groups'] = group_order(world.enemy_list)
+    food = world.food
+    for name in FOOD_ARRAYS:
+        arrays['food_' + name] = getattr(food, name)
+    arrays['food_awake'] = world.chunks.awake
+    chunks = list(world.chunks.chunks.values())
+    arrays['chunks'] = np.array([(*chunk.key, chunk.start, chunk.count) for chunk in chunks],
+                                dtype=np.int64).reshape(-1, 4)
+    arrays['chunk_awake'] = np.array([chunk.awake for chunk in chunks], dtype=bool)
+    arrays['chunk_slept_at'] = np.array([chunk.slept_at for chunk in chunks], dtype=float)
+    bullets = world.bullets
+    for name in BULLET_ARRAYS:
+        arrays['bullet_' + name] = getattr(bullets, name)
+    arrays['bullet_free'] = np.array(bullets.free, dtype=np.int64)
+    dump_grid(arrays, 'cell_hash', world.cell_hash, attrgetter('id'))
+    dump_grid(arrays, 'food_hash', world.food_hash)
+    _, spawn_state, spawn_gauss = world.spawn_rng.getstate()
+    _, cell_state, cell_gauss = world.cell_rng.getstate()
+    arrays['spawn_rng'] = np.array(spawn_state, dtype=np.uint32)
+    arrays['cell_rng'] = np.array(cell_state, dtype=np.uint32)
+
+    meta = {
+        'mode': world.mode,
+        'seed': str(world.seed),
+        'flags': world.flags,
+        'width': world.width,
+        'height': world.height,
+        'food_count': world.food_count,
+        'enemy_count': world.enemy_count,
+        'respawn_count': world.respawn_count,
+        'tick': world.tick,
+        'time': world.time,
+        'next_cell_id': world.next_cell_id,
+        'next_player_id': world.next_player_id,
+        'max_cell_radius': world.max_cell_radius,
+        'players': [[player.id, player.name, player.flag, player.team, player.state, player.target,
+                     player.weapon_selection_active] for player in world.players.values()],
+        'available_names': world.available_names,
+        'kills': list(world.kills.items()),  # JSON object keys would turn the lineages into strings
+        'killer_names': list(world.killer_names.items()),
+        'team_scores': world.team_scores,
+        'game_timer': world.game_timer,
+        'safe_zone': None if world.safe_zone is None else [
+            world.safe_zone_start, world.safe_zone_radius, world.safe_zone_damage,
+            world.safe_zone_stage, world.safe_zone_center],
+        'ai': [world.bot_ai.budget_ms, world.bot_ai.plan_cost_ms],
+        'bullet_count': bullets.count,
+        'rng_gauss': [spawn_gauss, cell_gauss],
+        'food_rng': food.rng.bit_generator.state,
+        'ai_rng': world.bot_ai.rng.bit_generator.state,
+        'strings': list(strings),
+        'arrays': [[name, array.dtype.str, array.shape] for name, array in arrays.items()],
+    }
+    meta = json.dumps(meta, separators=(',', ':')).encode()
+    return b''.join(chain((HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(meta)), meta),
+                          (array.tobytes() for array in arrays.values())))
+
+def restore_snapshot(data):
+    return without_gc(unpack_world, data)
+
+def without_gc(function, *args):
+    # Restoring makes thousands of containers and no garbage; keep the
+    # cycle collector from running over them halfway through
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return function(*args)
+    finally:
+        if enabled:
+            gc.enable()
+
+def unpack_world(data):
+    magic, version, meta_length = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f"Not a version {SNAPSHOT_VERSION} snapshot")
+    offset = HEADER.size
+    meta = json.loads(data[offset:offset + meta_length])
+    offset += meta_length
+    arrays = {}
+    for name, dtype, shape in meta['arrays']:
+        dtype = SNAPSHOT_DTYPES.get(name) or np.dtype(dtype)
+        count = math.prod(shape)
+        arrays[name] = np.frombuffer(data, dtype, count, offset).reshape(shape)
+        offset += dtype.itemsize * count
+
+    budget_ms, plan_cost_ms = meta['ai']
+    world = World(meta['mode'], flags=meta['flags'], food_count=meta['food_count'],
+                  enemy_count=meta['enemy_count'], ai_budget_ms=budget_ms, seed=int(meta['seed']),
+                  width=meta['width'], height=meta['height'])
+    world.respawn_count = meta['respawn_count']
+    world.tick = meta['tick']
+    world.time = meta['time']
+    world.next_cell_id = meta['next_cell_id']
+    world.next_player_id = meta['next_player_id']
+    world.max_cell_radius = meta['max_cell_radius']
+    world.available_names = meta['available_names']
+    world.kills = dict(meta['kills'])
+    world.killer_names = dict(meta['killer_names'])
+    world.team_scores = meta['team_scores']
+    world.game_timer = meta['game_timer']
+    world.bot_ai.plan_cost_ms = plan_cost_ms
+    for player_id, name, flag, team, state, target, weapon_selection_active in meta['players']:
+        player = world.players[player_id] = Player(player_id, name, flag, team)
+        player.state = state
+        player.target = tuple(target) if target is not None else None
+        player.weapon_selection_active = weapon_selection_active
+    if meta['safe_zone'] is not None:
+        world.safe_zone = SafeZone(world.streams.sequences['zone'], world.width, world.height)
+        (world.safe_zone_start, world.safe_zone_radius, world.safe_zone_damage,
+         world.safe_zone_stage, world.safe_zone_center) = meta['safe_zone']
+
+    # Cells, then the bots' references to the cells they hunt or flee
+    strings = meta['strings']
+    cells = {}
+    player_cells = []
+    enemies = []
+    targets = []
+    for (cell_id, lineage, player_id, x, y, prev_x, prev_y, radius, mass, speed, dx, dy, split_cooldown,
+         weapon_cooldown, weapon_level, movement_locked, locked_dx, locked_dy, team, name, flag, weapon,
+         alive, ai_mode, ai_target, goal_x, goal_y, has_goal, planned_tick) in arrays['cells'].tolist():
+        if player_id >= 0:
+            cell = PlayerCell(x, y, radius, mass, speed, strings[name], strings[flag], TEAM_NAMES[team], player_id)
+            player_cells.append(cell)
+        else:
+            cell = EnemyCell(x, y, radius, mass, speed, strings[name], strings[flag], TEAM_NAMES[team])
+            cell.ai_mode = ai_mode
+            cell.ai_goal = [goal_x, goal_y] if has_goal else None
+            cell.ai_planned_tick = planned_tick
+            if ai_target >= 0:
+                targets.append((cell, ai_target))
+            enemies.append(cell)
+        cell.id = cell_id
+        cell.lineage = lineage
+        cell.prev_pos = [prev_x, prev_y]
+        cell.direction = [dx, dy]
+        cell.split_cooldown = split_cooldown
+        cell.weapon_cooldown = weapon_cooldown
+        cell.weapon_level = weapon_level
+        cell.weapon = WEAPON_NAMES[weapon]
+        cell.movement_locked = movement_locked
+        cell.locked_direction = [locked_dx, locked_dy]
+        cell.alive = alive
+        cells[cell_id] = cell
+    for cell, target_id in targets:
+        target = cells.get(target_id)
+        if target is None:
+            # The target has left the world; the bot only needs to see it is dead
+            target = cells[target_id] = Cell(0, 0, 0, 0, 0, '', None)
+            target.id = target_id
+            target.alive = False
+        cell.ai_target = target
+    restore_registry(world.player_cells, player_cells, arrays['player_groups'])
+    restore_registry(world.enemy_list, enemies, arrays['enemy_groups'])
+    restore_grid(world.cell_hash, 'cell_hash', arrays, cells)
+
+    food = world.food
+    for name in FOOD_ARRAYS:
+        setattr(food, name, arrays['food_' + name].copy())
+    food.resized()
+    world.chunks.awake = arrays['food_awake'].copy()
+    for (column, row, start, count), awake, slept_at in zip(arrays['chunks'].tolist(), arrays['chunk_awake'].tolist(),
+                                                             arrays['chunk_slept_at'].tolist()):
+        chunk = world.chunks.chunks[column, row] = Chunk((column, row), start, count)
+        chunk.awake = awake
+        chunk.slept_at = slept_at
+    restore_grid(world.food_hash, 'food_hash', arrays)
+    bullets = world.bullets
+    for name in BULLET_ARRAYS:
+        setattr(bullets, name, arrays['bullet_' + name].copy())
+    bullets.free = arrays['bullet_free'].tolist()
+    bullets.count = meta['bullet_count']
+
+    spawn_gauss, cell_gauss = meta['rng_gauss']
+    world.spawn_rng.setstate((3, tuple(arrays['spawn_rng'].tolist()), spawn_gauss))
+    world.cell_rng.setstate((3, tuple(arrays['cell_rng'].tolist()), cell_gauss))
+    food.rng.bit_generator.state = meta['food_rng']
+    world.bot_ai.rng.bit_generator.state = meta['ai_rng']
+    return world
+
+def save_snapshot(world, path):
+    with open(path, 'wb') as file:
+        file.write(dump_snapshot(world))
+
+def load_snapshot(path):
+    with open(path, 'rb') as file:
+        return restore_snapshot(file.read())
+
+def group_order(registry):
+    # Ids of every group's members, group by group, in iteration order
+    return np.fromiter(chain.from_iterable(registry.groups.values()), dtype=np.int64)
+
+def restore_registry(registry, items, group_ids):
+    registry.items = items
+    registry.positions = {entity.id: index for index, entity in enumerate(items)}
+    groups = registry.groups = {}
+    for entity_id in group_ids.tolist():
+        key = getattr(items[registry.positions[entity_id]], registry.group_by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {}
+        group[entity_id] = None
+
+def dump_grid(arrays, name, grid, object_id=None):
+    # Bucket keys, sizes and contents of every level, in iteration order
+    for level, spatial_hash in enumerate(grid.levels):
+        buckets = spatial_hash.buckets
+        objects = chain.from_iterable(buckets.values())
+        if object_id is not None:
+            objects = map(object_id, objects)
+        arrays[f'{name}{level}_keys'] = np.array(list(buckets), dtype=np.int32).reshape(-1, 2)
+        arrays[f'{name}{level}_sizes'] = np.fromiter(map(len, buckets.values()), dtype=np.int32,
+                                                     count=len(buckets))
+        arrays[f'{name}{level}_objects'] = np.fromiter(objects, dtype=np.int32, count=len(spatial_hash))
+
+def restore_grid(grid, name, arrays, objects=None):
+    # objects maps stored ids back to objects; without it the ids are the objects
+    for level, spatial_hash in enumerate(grid.levels):
+        stored = arrays[f'{name}{level}_objects'].tolist()
+        if objects is not None:
+            stored = [objects[object_id] for object_id in stored]
+        keys = list(map(tuple, arrays[f'{name}{level}_keys'].tolist()))
+        sizes = arrays[f'{name}{level}_sizes'].tolist()
+        ends = list(accumulate(sizes))
+        spatial_hash.buckets = {key: dict.fromkeys(stored[end - size:end]) for key, size, end in zip(keys, sizes, ends)}
+        if isinstance(spatial_hash, PointHash):
+            spatial_hash.count = len(stored)
+        else:
+            spatial_hash.object_keys = dict(zip(stored, chain.from_iterable(map(repeat, keys, sizes))))
@@ -0,0 +1,249 @@
+import heapq
+from operator import itemgetter
+
+import numpy as np
+
+# Spatial partitioning shared by the simulation
+
+GRID_LEVELS = 4  # Levels in a HierarchicalGrid, each with buckets twice as wide
+MAX_QUERY_SPAN = 4  # Buckets per axis a HierarchicalGrid query may visit on one level
+
+# Persistent spatial hash: objects stay bucketed between ticks and are only
+# re-bucketed when they cross a cell boundary. Buckets are dicts used as
+# ordered sets, so removal is O(1) and iteration order follows insertion.
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.object_keys = {}  # Object -> bucket it is stored in
+
+    def __len__(self):
+        return len(self.object_keys)
+
+    def __contains__(self, obj):
+        return obj in self.object_keys
+
+    def key(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, obj, x, y):
+        key = self.key(x, y)
+        self.object_keys[obj] = key
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {}
+        bucket[obj] = None
+
+    def remove(self, obj):
+        key = self.object_keys.pop(obj)
+        bucket = self.buckets[key]
+        del bucket[obj]
+        if not bucket:
+            del self.buckets[key]
+
+    def move(self, obj, x, y):
+        # Returns True if the object changed buckets
+        key = self.key(x, y)
+        old_key = self.object_keys[obj]
+        if key == old_key:
+            return False  # Still in the same bucket
+        bucket = self.buckets[old_key]
+        del bucket[obj]
+        if not bucket:
+            del self.buckets[old_key]
+        self.object_keys[obj] = key
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {}
+        bucket[obj] = None
+        return True
+
+    def query(self, x, y, radius):
+        # Yield the objects in every bucket the circle overlaps; callers do the
+        # exact distance test and must not modify the hash while iterating
+        size = self.cell_size
+        buckets = self.buckets
+        radius_sq = radius * radius
+        min_gy = int((y - radius) // size)
+        max_gy = int((y + radius) // size)
+        for gx in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            # Distance from the circle center to this column of buckets
+            left = gx * size
+            if x < left:
+                dx = left - x
+            elif x > left + size:
+                dx = x - left - size
+            else:
+                dx = 0
+            dx_sq = dx * dx
+            for gy in range(min_gy, max_gy + 1):
+                bucket = buckets.get((gx, gy))
+                if not bucket:
+                    continue
+                top = gy * size
+                if y < top:
+                    dy = top - y
+                elif y > top + size:
+                    dy = y - top - size
+                else:
+                    dy = 0
+                if dx_sq + dy * dy <= radius_sq:
+                    yield from bucket
+
+    def buckets_in(self, left, top, right, bottom):
+        # The non-empty buckets a rectangle overlaps, for callers that take
+        # whole buckets at once (e.g. into a NumPy array)
+        size = self.cell_size
+        buckets = self.buckets
+        found = []
+        min_gy = int(top // size)
+        max_gy = int(bottom // size)
+        for gx in range(int(left // size), int(right // size) + 1):
+            for gy in range(min_gy, max_gy + 1):
+                bucket = buckets.get((gx, gy))
+                if bucket:
+                    found.append(bucket)
+        return found
+
+# Spatial hash for points that never move and whose position the caller
+# always has at hand, such as food slots. There is no object -> bucket index:
+# removal finds the bucket from the position, so the hash holds half as many
+# entries and restoring one from a snapshot costs half as much.
+class PointHash(SpatialHash):
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, obj):
+        # Looks in every bucket, so only cheap on a coarse level
+        return any(obj in bucket for bucket in self.buckets.values())
+
+    def insert(self, obj, x, y):
+        key = self.key(x, y)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {}
+        bucket[obj] = None
+        self.count += 1
+
+    def remove(self, obj, x, y):
+        # x, y must be the position the object was inserted at
+        key = self.key(x, y)
+        bucket = self.buckets[key]
+        del bucket[obj]
+        self.count -= 1
+        if not bucket:
+            del self.buckets[key]
+
+    def move(self, obj, x, y):
+        raise TypeError("Points do not move; remove and insert them again")
+
+# Stack of spatial hashes with doubling bucket sizes. Every object is stored
+# on every level; a query runs on the finest level where the circle spans at
+# most MAX_QUERY_SPAN buckets per axis, so huge query radii stay cheap.
+class HierarchicalGrid:
+    def __init__(self, cell_size, levels=GRID_LEVELS):
+        self.levels = [SpatialHash(cell_size * 2 ** level) for level in range(levels)]
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def __contains__(self, obj):
+        return obj in self.levels[0]
+
+    def insert(self, obj, x, y):
+        for grid in self.levels:
+            grid.insert(obj, x, y)
+
+    def remove(self, obj):
+        for grid in self.levels:
+            grid.remove(obj)
+
+    def move(self, obj, x, y):
+        # A coarser bucket can only change when the finer one does
+        if not self.levels[0].move(obj, x, y):
+            return False
+        for grid in self.levels[1:]:
+            grid.move(obj, x, y)
+        return True
+
+    def query(self, x, y, radius):
+        for grid in self.levels:
+            if 2 * radius <= grid.cell_size * (MAX_QUERY_SPAN - 1):
+                return grid.query(x, y, radius)
+        return self.levels[-1].query(x, y, radius)
+
+    def buckets_in(self, left, top, right, bottom):
+        span = max(right - left, bottom - top)
+        for grid in self.levels:
+            if span <= grid.cell_size * (MAX_QUERY_SPAN - 1):
+                return grid.buckets_in(left, top, right, bottom)
+        return self.levels[-1].buckets_in(left, top, right, bottom)
+
+    def nearest(self, x, y, k, radius, position, accept=None):
+        # Up to k objects closest to (x, y) within radius, nearest first, as
+        # (distance squared, object) pairs. position(obj) gives an object's
+        # point and accept(obj) filters candidates. The search starts one
+        # bucket wide and doubles until it finds k objects or reaches radius,
+        # so crowded areas stay cheap.
+        search = min(radius, self.levels[0].cell_size)
+        while True:
+            search_sq = search * search
+            found = []
+            for obj in self.query(x, y, search):
+                if accept is not None and not accept(obj):
+                    continue
+                px, py = position(obj)
+                dist_sq = (px - x) ** 2 + (py - y) ** 2
+                if dist_sq <= search_sq:
+                    found.append((dist_sq, obj))
+            if len(found) >= k or search >= radius:
+                return heapq.nsmallest(k, found, key=itemgetter(0))
+            search = min(radius, search * 2)
+
+# HierarchicalGrid of PointHash levels
+class PointGrid(HierarchicalGrid):
+    def __init__(self, cell_size, levels=GRID_LEVELS):
+        self.levels = [PointHash(cell_size * 2 ** level) for level in range(levels)]
+
+    def __contains__(self, obj):
+        return obj in self.levels[-1]
+
+    def remove(self, obj, x, y):
+        for grid in self.levels:
+            grid.remove(obj, x, y)
+
+    def move(self, obj, x, y):
+        raise TypeError("Points do not move; remove and insert them again")
+
+def expand_ranges(starts, counts):
+    # Concatenation of range(start, start + count) for every pair, vectorized
+    total = int(counts.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+def overlapping_pairs(x, y, radius):
+    # Every pair of circles that overlap, as index arrays (first < second)
+    # sorted by first then second. Sort and sweep along x: after sorting by
+    # left edge, each circle only has to look at the run of circles whose
+    # left edge starts before its right edge.
+    order = np.argsort(x - radius, kind='stable')
+    left = (x - radius)[order]
+    right = (x + radius)[order]
+    ends = np.searchsorted(left, right, 'right')
+    starts = np.arange(len(order)) + 1
+    counts = np.maximum(ends - starts, 0)
+    first = order[np.repeat(np.arange(len(order)), counts)]
+    second = order[expand_ranges(starts, counts)]
+
+    dx = x[first] - x[second]
+    dy = y[first] - y[second]
+    reach = radius[first] + radius[second]
+    overlap = dx * dx + dy * dy < reach * reach
+    first, second = np.minimum(first, second)[overlap], np.maximum(first, second)[overlap]
+    pairs = np.lexsort((second, first))
+    return first[pairs], second[pairs]
@@ -0,0 +1,248 @@
+import multiprocessing
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from spatial import expand_ranges, overlapping_pairs
+
+# Collision detection spread over worker processes. The world is cut into
+# horizontal strips holding about the same number of cells; every tick the
+# cells and food go into shared memory buffers, each worker reads its strip
+# plus a ghost border as wide as the reach of the largest cell, and sends
+# back what it found. Each pellet and each pair of cells belongs to exactly
+# one strip (the one holding the pellet, or the pair's first cell), so the
+# merged results are the same sets the single-core path finds; the world
+# then resolves them in the same order, and the outcome is identical tick
+# for tick.
+#
+# Only this detection is parallel. Movement, AI, bullets, feeding, food
+# grid upkeep and the copy into shared memory stay in the main process, and
+# on a crowded world they are most of the tick, so more workers stop
+# helping after the first few (bench.strips measures where).
+#
+# Food is shared sorted by band (FOOD_BAND pixel rows) and then x, so a
+# strip's food is one run of the sorted order and a cell finds its
+# candidates with a binary search per band it overlaps. The order is kept
+# between ticks and only respawned pellets are re-inserted.
+#
+#   world = World('classic', workers=8)
+#   ...
+#   world.close()
+
+CELL_FIELDS = (('x', np.float64), ('y', np.float64), ('radius', np.float64), ('team', np.int8), ('alive', bool))
+# x, y and alive by slot; order and key by rank in the sorted order
+FOOD_FIELDS = (('x', np.float64), ('y', np.float64), ('alive', bool), ('order', np.int64), ('key', np.float64))
+FOOD_BAND = 128
+BAND_LIMIT = 1 << 40  # Band index past any world edge, for the outer strips
+MIN_CAPACITY = 1024
+
+# Parallel arrays in one shared memory block, grown by replacing the block
+def layout(fields, capacity):
+    offsets = []
+    size = 0
+    for name, dtype in fields:
+        size = -(-size // 8) * 8  # Keep every array 8 byte aligned
+        offsets.append((name, dtype, size))
+        size += np.dtype(dtype).itemsize * capacity
+    return offsets, size
+
+def views(buffer, fields, capacity):
+    offsets, _ = layout(fields, capacity)
+    return {name: np.ndarray(capacity, dtype, buffer, offset) for name, dtype, offset in offsets}
+
+class SharedArrays:
+    def __init__(self, fields):
+        self.fields = fields
+        self.capacity = 0
+        self.memory = None
+        self.arrays = {}
+
+    def ensure(self, count):
+        if self.memory is not None and count <= self.capacity:
+            return
+        self.close()
+        self.capacity = max(MIN_CAPACITY, self.capacity * 2, count)
+        self.memory = SharedMemory(create=True, size=layout(self.fields, self.capacity)[1])
+        self.arrays = views(self.memory.buf, self.fields, self.capacity)
+
+    def fill(self, **values):
+        count = len(next(iter(values.values())))
+        self.ensure(count)
+        for name, array in values.items():
+            self.arrays[name][:count] = array
+        return count
+
+    def close(self):
+        if self.memory is not None:
+            self.arrays = {}
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+# Worker side: shared blocks stay attached between ticks, until the parent
+# replaces them with bigger ones
+attached = {}
+
+def attach(blocks):
+    # Views of the cell and food arrays described by (name, capacity, count)
+    for name in list(attached):
+        if name not in (blocks[0][0], blocks[1][0]):
+            attached.pop(name).close()
+    arrays = []
+    for (name, capacity, count), fields in zip(blocks, (CELL_FIELDS, FOOD_FIELDS)):
+        if name not in attached:
+            attached[name] = SharedMemory(name=name)
+        arrays.append({key: array[:count] for key, array in views(attached[name].buf, fields, capacity).items()})
+    return arrays
+
+def strip_food(task):
+    # (pellets, cells): every live pellet in the strip and the first live
+    # cell, in world order, whose circle holds it
+    blocks, first_band, last_band, span = task
+    cells, food = attach(blocks)
+    top = first_band * FOOD_BAND
+    bottom = last_band * FOOD_BAND
+    keys = food['key']
+    lo, hi = np.searchsorted(keys, (first_band * span, last_band * span))
+    keys = keys[lo:hi]
+
+    # Every (cell, band) pair where a cell's circle crosses a band of the strip
+    x = cells['x']
+    y = cells['y']
+    radius = cells['radius']
+    near = np.flatnonzero(cells['alive'] & (y + radius >= top) & (y - radius < bottom))
+    cell_first = np.maximum((y[near] - radius[near]) // FOOD_BAND, first_band).astype(np.int64)
+    cell_last = np.minimum((y[near] + radius[near]) // FOOD_BAND, last_band - 1).astype(np.int64)
+    counts = cell_last - cell_first + 1
+    owner = np.repeat(near, counts)
+    band = expand_ranges(cell_first, counts)
+
+    # The pellets of those bands within reach along x
+    starts = np.searchsorted(keys, band * span + x[owner] - radius[owner], 'left')
+    counts = np.searchsorted(keys, band * span + x[owner] + radius[owner], 'right') - starts
+    pellet = food['order'][lo + expand_ranges(starts, counts)]
+    owner = np.repeat(owner, counts)
+    alive = food['alive'][pellet]
+    pellet = pellet[alive]
+    owner = owner[alive]
+
+    # The same test as FoodStore.eat
+    dx = food['x'][pellet] - x[owner]
+    dy = food['y'][pellet] - y[owner]
+    owner_radius = radius[owner]
+    inside = dx * dx + dy * dy < owner_radius * owner_radius
+    pellet = pellet[inside]
+    owner = owner[inside]
+    order = np.lexsort((owner, pellet))
+    pellet = pellet[order]
+    owner = owner[order]
+    first = np.ones(len(pellet), dtype=bool)
+    first[1:] = pellet[1:] != pellet[:-1]
+    return pellet[first], owner[first]
+
+def strip_pairs(task):
+    # (first, second): overlapping pairs of cells whose first cell is in the
+    # strip, on different teams, where one can eat the other
+    blocks, first_band, last_band, reach = task
+    cells, _ = attach(blocks)
+    top = first_band * FOOD_BAND
+    bottom = last_band * FOOD_BAND
+    y = cells['y']
+    near = np.flatnonzero((y >= top - 2 * reach) & (y < bottom + 2 * reach))
+    radius = cells['radius']
+    team = cells['team']
+    first, second = overlapping_pairs(cells['x'][near], y[near], radius[near])
+    first = near[first]
+    second = near[second]
+    owned = (y[first] >= top) & (y[first] < bottom)
+    first = first[owned]
+    second = second[owned]
+    edible = ((team[first] != team[second]) &
+              ((radius[first] > radius[second] * 1.1) | (radius[second] > radius[first] * 1.1)))
+    return first[edible], second[edible]
+
+class StripPool:
+    def __init__(self, workers):
+        self.workers = workers
+        # Workers have to share this process's resource tracker; with one of
+        # their own they would unlink the shared blocks when they exit
+        resource_tracker.ensure_running()
+        self.pool = multiprocessing.Pool(workers)
+        self.cells = SharedArrays(CELL_FIELDS)
+        self.food = SharedArrays(FOOD_FIELDS)
+        self.bounds = []  # Strip edges for the current tick
+        self.blocks = None  # (name, capacity, count) of the cell and food blocks
+        self.span = 0
+        self.food_order = np.zeros(0, dtype=np.int64)  # Food slots by (band, x)
+        self.food_key = np.zeros(0)  # Sort key of every slot when last sorted
+        self.sorted_key = np.zeros(0)  # food_key in food_order
+        self.parallel_ns = 0  # Time spent waiting on the workers; everything else here is serial
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.cells.close()
+        self.food.close()
+
+    def split(self, y):
+        # Strips as runs of food bands, cut at quantiles of the cells' y so
+        # they are about equally busy; the outer strips reach to infinity
+        cuts = np.quantile(y, np.linspace(0, 1, self.workers + 1)[1:-1]) // FOOD_BAND if len(y) else []
+        cuts = [-BAND_LIMIT] + [int(cut) for cut in cuts] + [BAND_LIMIT]
+        return list(zip(cuts[:-1], cuts[1:]))
+
+    def run(self, function, tasks):
+        start = time.perf_counter_ns()
+        results = self.pool.map(function, tasks)
+        self.parallel_ns += time.perf_counter_ns() - start
+        return results
+
+    def share(self, shared, **values):
+        count = shared.fill(**values)
+        return (shared.memory.name, shared.capacity, count)
+
+    def sort_food(self, food):
+        # Food slots ordered by (band, x), updated in place of a full sort:
+        # pellets that moved since the last tick are taken out and inserted
+        # again at their new place
+        key = (food.y // FOOD_BAND) * self.span + food.x
+        known = len(self.food_key)
+        changed = np.ones(len(key), dtype=bool)
+        changed[:known] = key[:known] != self.food_key
+        stay = ~changed[self.food_order]
+        kept = self.food_order[stay]
+        kept_key = self.sorted_key[stay]
+        moved = np.flatnonzero(changed)
+        moved = moved[np.argsort(key[moved], kind='stable')]
+        moved_key = key[moved]
+        at = np.searchsorted(kept_key, moved_key, 'right')
+        self.food_order = np.insert(kept, at, moved)
+        self.sorted_key = np.insert(kept_key, at, moved_key)
+        self.food_key = key
+        return self.sorted_key
+
+    def eaten_food(self, x, y, radius, team, alive, food, width):
+        # Pellet slots and the index of the cell that eats each one
+        self.span = width + 1  # Keeps every band's keys apart
+        sorted_key = self.sort_food(food)
+        self.blocks = (self.share(self.cells, x=x, y=y, radius=radius, team=team, alive=alive),
+                       self.share(self.food, x=food.x, y=food.y, alive=food.alive, order=self.food_order,
+                                  key=sorted_key))
+        self.bounds = self.split(y)
+        results = self.run(strip_food, [(self.blocks, first_band, last_band, self.span)
+                                        for first_band, last_band in self.bounds])
+        return (np.concatenate([pellets for pellets, _ in results]),
+                np.concatenate([cells for _, cells in results]))
+
+    def edible_pairs(self, x, y, radius, team, alive):
+        # Every pair check_collisions has to resolve, sorted like overlapping_pairs
+        self.blocks = (self.share(self.cells, x=x, y=y, radius=radius, team=team, alive=alive), self.blocks[1])
+        reach = float(radius.max()) if len(radius) else 0.0
+        results = self.run(strip_pairs, [(self.blocks, first_band, last_band, reach)
+                                         for first_band, last_band in self.bounds])
+        first = np.concatenate([first for first, _ in results])
+        second = np.concatenate([second for _, second in results])
+        order = np.lexsort((second, first))
+        return first[order], second[order]